@@ -1,3 +1,4 @@
 from .cache import Cache
+from .field_store import StaticFieldStore
 
-__all__ = [Cache]
\ No newline at end of file
+__all__ = [Cache, StaticFieldStore]
\ No newline at end of file
@@ -1,36 +1,188 @@
-from typing import Dict, List, Tuple, Any
-from PathFinding import find_path
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Set, NamedTuple, Optional
+from PathFinding import CongestionField, get_path_finder, get_path_cost
+from utils import (no_move, get_move_code, get_congestion_settings, path_cache_size, path_cache_horizon,
+                   batched_congestion_paths, path_backend)
 from numpy.typing import NDArray
 
 Position = Tuple[int, int]
 CacheKey = Tuple[Position, Position]
-Path = List[Position]
+Region = Tuple[int, int, int, int]
+Tile = Tuple[int, int]
+
+
+class CacheEntry(NamedTuple):
+    """
+    Cached result of a congested path search.
+
+    Attributes:
+        move_code: Code of the first move of the path (no_move if none)
+        cost: Congestion-weighted cost of the path (infinity if unreachable)
+        region: (y_min, y_max, x_min, x_max) cells whose occupancy the path depends on
+    """
+    move_code: int
+    cost: float
+    region: Region
 
 
 class Cache:
     """
     Caches pathfinding results to improve performance.
 
-    This class implements a caching system for pathfinding results to avoid
-    recalculating paths that have been previously computed. It also includes
-    a periodic cache clearing mechanism to prevent memory bloat.
+    This class implements a bounded LRU cache for congested pathfinding results.
+    Each entry records the region of the grid its path depends on, and is only
+    dropped when the occupancy of a cell in that region changes or when the
+    cache is full. Only the code of the first move and the cost of each path
+    are kept.
+
+    The region covers the first `horizon` cells of the path grown by the
+    congestion radius: pedestrians moving farther along the path rarely change
+    the first move, so they do not invalidate it.
+
+    In batched mode the next moves come instead from one congestion-weighted
+    Dijkstra per exit and step (CongestionField), shared by every pedestrian.
 
     Attributes:
-        path_cache (Dict[CacheKey, Path]): Stores computed paths
-        cost_cache (Dict): Stores computed costs (currently unused)
+        path_cache (OrderedDict[CacheKey, CacheEntry]): Cached results, least recently used first
+        capacity (int): Maximum number of cached results
+        radius (Optional[int]): Congestion radius used by the searches, None for the grid's
+        horizon (Optional[int]): Number of path cells covered by the region (None for the whole path)
+        tile_size (int): Side of the tiles used to index entries by region
+        congestion_field (Optional[CongestionField]): Shared per-exit fields in batched mode
+        path_finder (Callable): Pathfinding backend with the find_path signature
+        layout_version (int): Floor layout the cached paths were searched on
+        hits (int): Lookups answered from the cache
+        misses (int): Lookups that ran a search
+        evictions (int): Entries dropped because the cache was full
+        invalidations (int): Entries dropped because their region changed
     """
 
-    def __init__(self) -> None:
-        """Initialize empty path and cost caches."""
-        self.path_cache: Dict[CacheKey, Path] = {}
-        self.cost_cache: Dict = {}  # Reserved for future use
+    def __init__(
+            self,
+            capacity: int = path_cache_size,
+            radius: Optional[int] = None,
+            horizon: Optional[int] = path_cache_horizon,
+            tile_size: int = 8,
+            batched: bool = batched_congestion_paths,
+            backend: str = path_backend
+    ) -> None:
+        """
+        Initialize an empty cache.
 
-    def cache_path(self, pedestrian: Any, exit: Position, grid: NDArray) -> Path:
+        Args:
+            capacity: Maximum number of cached results
+            radius: Congestion radius used by the searches, the grid's congestion radius if not given
+            horizon: Number of path cells covered by the region (None for the whole path)
+            tile_size: Side of the tiles used to index entries by region
+            batched: Whether to share one congestion Dijkstra per exit between pedestrians
+            backend: Pathfinding backend used for the searches ('astar', 'jps', 'hpa')
+        """
+        self.path_cache: 'OrderedDict[CacheKey, CacheEntry]' = OrderedDict()
+        self.capacity = capacity
+        self.radius = radius
+        self.horizon = horizon
+        self.tile_size = tile_size
+        self.congestion_field = CongestionField(radius) if batched else None
+        self.path_finder = get_path_finder(backend)
+        self.layout_version = 0
+
+        # Tile -> keys of the entries whose region overlaps the tile
+        self.tiles: Dict[Tile, Set[CacheKey]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        """Number of cached results."""
+        return len(self.path_cache)
+
+    def get_tiles(self, region: Region) -> List[Tile]:
+        """
+        Get the tiles overlapping a region.
+
+        Args:
+            region: (y_min, y_max, x_min, x_max), max bounds excluded
+
+        Returns:
+            List of (tile_y, tile_x) indices
+        """
+        y_min, y_max, x_min, x_max = region
+        size = self.tile_size
+
+        return [(tile_y, tile_x)
+                for tile_y in range(y_min // size, (y_max - 1) // size + 1)
+                for tile_x in range(x_min // size, (x_max - 1) // size + 1)]
+
+    def get_region(self, path: List[Position], grid: Any) -> Region:
+        """
+        Get the cells whose occupancy a congested path depends on.
+
+        Args:
+            path: List of positions of the path
+            grid: Environment grid
+
+        Returns:
+            Bounding box of the first horizon cells of the path grown by the
+            congestion radius, clipped to the grid
+        """
+        height, width = grid.grid.shape if hasattr(grid, 'grid') else grid.shape
+        path = path[:self.horizon]
+        ys = [y for y, _ in path]
+        xs = [x for _, x in path]
+        radius = get_congestion_settings(grid)[1] if self.radius is None else self.radius
+
+        return (max(0, min(ys) - radius), min(height, max(ys) + radius + 1),
+                max(0, min(xs) - radius), min(width, max(xs) + radius + 1))
+
+    def get_entry(self, pedestrian: Any, exit: Position, grid: NDArray) -> CacheEntry:
+        """
+        Cache and retrieve the congested path search from a pedestrian to an exit.
+
+        Args:
+            pedestrian: Pedestrian object containing current position
+            exit: Exit position (y, x)
+            grid: Environment grid
+
+        Returns:
+            Cached entry with the first move, cost and region of the path
+        """
+        # Paths searched before walls or exits changed are all outdated
+        layout_version = getattr(grid, 'layout_version', 0)
+        if layout_version != self.layout_version:
+            self.clear()
+            self.layout_version = layout_version
+
+        cache_key = (pedestrian.position, exit)
+
+        entry = self.path_cache.get(cache_key)
+        if entry is not None:
+            self.hits += 1
+            self.path_cache.move_to_end(cache_key)
+            return entry
+
+        self.misses += 1
+        path = self.path_finder(grid, pedestrian.position, exit, True)
+
+        if len(path) > 1:
+            move_code = get_move_code((path[1][0] - path[0][0], path[1][1] - path[0][1]))
+        else:
+            move_code = no_move
+
+        cost = get_path_cost(path, grid, True)
+        entry = CacheEntry(move_code, cost, self.get_region(path or [pedestrian.position, exit], grid))
+        self.add(cache_key, entry)
+
+        return entry
+
+    def cache_path(self, pedestrian: Any, exit: Position, grid: NDArray) -> int:
         """
         Cache and retrieve pathfinding results.
 
         Checks if a path has been previously calculated for the given
-        start and end positions. If not, calculates and caches the new path.
+        start and end positions. If not, calculates the path and caches
+        the code of its first move.
 
         Args:
             pedestrian: Pedestrian object containing current position
@@ -38,27 +190,102 @@ class Cache:
             grid: Environment grid
 
         Returns:
-            List of positions representing the path to the exit
+            Code of the next move towards the exit (see utils.move_offsets),
+            no_move if the exit is reached or cannot be reached
 
         Note:
-            Uses pedestrian's current position and exit position as cache key
+            Uses pedestrian's current position and exit position as cache key.
+            In batched mode reads the shared per-exit congestion field instead.
         """
-        cache_key = (pedestrian.position, exit)
-        if cache_key not in self.path_cache:
-            self.path_cache[cache_key] = find_path(grid, pedestrian.position, exit, True)
+        if self.congestion_field is not None:
+            return self.congestion_field.get_next_move(pedestrian.position, exit, grid)
+
+        return self.get_entry(pedestrian, exit, grid).move_code
+
+    def path_cost(self, pedestrian: Any, exit: Position, grid: NDArray) -> float:
+        """
+        Cache and retrieve the congestion-weighted cost of a path.
+
+        Args:
+            pedestrian: Pedestrian object containing current position
+            exit: Exit position (y, x)
+            grid: Environment grid
+
+        Returns:
+            Cost of the path to the exit, infinity if it cannot be reached
+        """
+        return self.get_entry(pedestrian, exit, grid).cost
 
-        return self.path_cache[cache_key]
+    def add(self, cache_key: CacheKey, entry: CacheEntry) -> None:
+        """
+        Add an entry, evicting the least recently used one if the cache is full.
+
+        Args:
+            cache_key: (start, exit) positions
+            entry: Result to cache
+        """
+        while len(self.path_cache) >= self.capacity:
+            old_key, _ = next(iter(self.path_cache.items()))
+            self.remove(old_key)
+            self.evictions += 1
+
+        self.path_cache[cache_key] = entry
+        for tile in self.get_tiles(entry.region):
+            self.tiles.setdefault(tile, set()).add(cache_key)
+
+    def remove(self, cache_key: CacheKey) -> None:
+        """
+        Remove an entry and its tile references.
+
+        Args:
+            cache_key: (start, exit) positions
+        """
+        entry = self.path_cache.pop(cache_key)
 
-    def clear_cache(self, steps: int) -> None:
+        for tile in self.get_tiles(entry.region):
+            keys = self.tiles[tile]
+            keys.discard(cache_key)
+            if not keys:
+                del self.tiles[tile]
+
+    def invalidate(self, changed_cells: Any) -> None:
         """
-        Periodically clear the path cache to prevent memory bloat.
+        Drop the entries whose region contains a cell whose occupancy changed.
 
         Args:
-            steps: Current simulation step count
+            changed_cells: Iterable of (y, x) positions that were vacated or occupied
 
         Note:
-            Clears cache every 3 steps (when steps % 3 == 0),
-            except at step 0
+            The start cell of an entry is ignored: whoever looks the entry up
+            stands on it, so it is always occupied when the entry is used.
+        """
+        size = self.tile_size
+
+        for y, x in changed_cells:
+            for cache_key in list(self.tiles.get((y // size, x // size), ())):
+                if cache_key[0] == (y, x):
+                    continue
+
+                y_min, y_max, x_min, x_max = self.path_cache[cache_key].region
+
+                if y_min <= y < y_max and x_min <= x < x_max:
+                    self.remove(cache_key)
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        self.path_cache.clear()
+        self.tiles.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the cache counters.
+
+        Returns:
+            Dictionary with size, hits, misses, evictions and invalidations
         """
-        if steps % 3 == 0 and steps != 0:
-            self.path_cache.clear()
\ No newline at end of file
+        return {'size': len(self.path_cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations}
@@ -0,0 +1,109 @@
+import hashlib
+import os
+from typing import List, Tuple, Any, Optional
+import numpy as np
+from numpy.typing import NDArray
+from utils import orthogonal_cost, diagonal_cost
+
+Position = Tuple[int, int]
+Fields = Tuple[NDArray, NDArray, NDArray]
+
+# Bump when the stored arrays change meaning, so old files are not reused
+FORMAT_VERSION = 2
+
+
+class StaticFieldStore:
+    """
+    Persists precomputed static fields on disk, keyed by floor plan.
+
+    The key hashes everything the fields depend on: wall layout, exits and
+    doors, and movement costs. Stored fields are memory-mapped read-only on
+    later runs, so several processes simulating the same venue share one copy.
+
+    Attributes:
+        directory (str): Folder holding the .npy files
+    """
+
+    def __init__(self, directory: str) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            directory: Folder where fields are saved, created if missing
+        """
+        self.directory = directory
+
+    @staticmethod
+    def layout_key(grid: Any, targets: List[Position]) -> str:
+        """
+        Hash a floor plan and the parameters its static fields depend on.
+
+        Args:
+            grid: Environment grid (FloorField or matrix)
+            targets: Exits and doors the fields are computed for, in order
+
+        Returns:
+            Hexadecimal digest identifying the fields
+        """
+        cells = np.asarray(getattr(grid, 'grid', grid))
+
+        digest = hashlib.sha256()
+        digest.update(np.array([FORMAT_VERSION, *cells.shape], dtype=np.int64).tobytes())
+        digest.update(np.packbits(cells == 3).tobytes())
+        digest.update(np.array(targets, dtype=np.int64).tobytes())
+        digest.update(np.array([orthogonal_cost, diagonal_cost], dtype=np.float64).tobytes())
+
+        return digest.hexdigest()
+
+    def get_paths(self, key: str) -> Tuple[str, str, str]:
+        """
+        Get the file paths of the fields stored under a key.
+
+        Args:
+            key: Floor plan key from layout_key
+
+        Returns:
+            Paths of the distances, next move codes and step counts files
+        """
+        return (os.path.join(self.directory, f'{key}_distances.npy'),
+                os.path.join(self.directory, f'{key}_next_moves.npy'),
+                os.path.join(self.directory, f'{key}_steps.npy'))
+
+    def load(self, key: str) -> Optional[Fields]:
+        """
+        Memory-map stored fields.
+
+        Args:
+            key: Floor plan key from layout_key
+
+        Returns:
+            Read-only (distances, next_moves, steps) arrays, or None if nothing is stored
+        """
+        paths = self.get_paths(key)
+        if not all(os.path.exists(path) for path in paths):
+            return None
+
+        return tuple(np.load(path, mmap_mode='r') for path in paths)
+
+    def save(self, key: str, distances: NDArray, next_moves: NDArray, steps: NDArray) -> None:
+        """
+        Store fields under a key.
+
+        Args:
+            key: Floor plan key from layout_key
+            distances: Movement costs to the targets, shape (targets, height, width)
+            next_moves: Next move codes, shape (targets, height, width)
+            steps: Step counts, shape (targets, height, width)
+
+        Note:
+            Files are written to a temporary name and renamed, so concurrent
+            runs never memory-map a half written file. Steps are written last
+            because load() only succeeds once every file exists.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        for path, array in zip(self.get_paths(key), (distances, next_moves, steps)):
+            temporary_path = f'{path}.{os.getpid()}.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.save(file, np.ascontiguousarray(array))
+            os.replace(temporary_path, path)
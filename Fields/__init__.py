@@ -1,5 +1,6 @@
 from .dynamic_field import DynamicField
 from .static_field import StaticField
 from .floor_field import FloorField
+from .occupancy import OccupancyTable
 
-__all__ = ['DynamicField', 'StaticField', 'FloorField']
\ No newline at end of file
+__all__ = ['DynamicField', 'StaticField', 'FloorField', 'OccupancyTable']
\ No newline at end of file
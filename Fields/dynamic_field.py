@@ -1,11 +1,27 @@
 import numpy as np
-from typing import List, Tuple
-from numpy.typing import NDArray
-from utils import kernel, delta, diffusion_coef
-from scipy.ndimage import convolve
+from typing import Dict, List, Tuple, Optional
+from numpy.typing import NDArray, DTypeLike
+from scipy.ndimage import binary_dilation
+from Matrix import gather_neighborhoods
+from utils import kernel, delta, diffusion_coef, dynamic_field_dtype, dynamic_field_tile_size, dynamic_field_threshold
 
 Position = Tuple[int, int]
 Positions = List[Position]
+Runs = List[Tuple[int, int]]
+
+
+def get_runs(mask: NDArray) -> Runs:
+    """
+    Find the runs of consecutive True values in a boolean row.
+
+    Args:
+        mask: 1D boolean array
+
+    Returns:
+        List of (start, end) indices of each run, end excluded
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return [(int(start), int(end)) for start, end in edges.reshape(-1, 2)]
 
 
 class DynamicField:
@@ -15,23 +31,78 @@ class DynamicField:
     This class handles a dynamic field that tracks pedestrian movement history
     and influences future movement decisions through pheromone-like traces.
 
+    The field lives in the interior of two preallocated buffers with a
+    one-cell border. Each step reads one buffer and writes the other, so
+    decay and diffusion run without allocating temporaries.
+
+    With tiles enabled, only the tiles holding values above the threshold
+    (plus a one-cell halo around them) are updated. Cells of every other
+    tile are zero in both buffers, so skipping them changes nothing, and
+    the cost of a step follows the area the crowd touched.
+
     Attributes:
         width (int): Width of the dynamic field
         height (int): Height of the dynamic field
-        dynamic_field (NDArray): Matrix storing dynamic field values
+        buffers (List[NDArray]): Two padded buffers, shape (height + 2, width + 2)
+        current (int): Index of the buffer holding the field
+        dynamic_field (NDArray): View of the field values in the current buffer
+        tile_size (Optional[int]): Side of the tiles, None to update the whole field
+        threshold (float): Tiles whose values all fall to or below it are zeroed and skipped
+        active (Optional[NDArray]): Boolean matrix of the tiles being updated
     """
 
-    def __init__(self, width: int, height: int) -> None:
+    def __init__(
+            self,
+            width: int,
+            height: int,
+            dtype: DTypeLike = dynamic_field_dtype,
+            tile_size: Optional[int] = dynamic_field_tile_size,
+            threshold: float = dynamic_field_threshold
+    ) -> None:
         """
         Initialize dynamic field with given dimensions.
 
         Args:
             width: Width of the field
             height: Height of the field
+            dtype: Storage type, np.float32 halves memory traffic on large grids
+            tile_size: Side of the tiles tracked as active, None to update the whole field
+            threshold: Value at or below which a tile is dropped (0 keeps every nonzero tile)
         """
         self.width = width
         self.height = height
-        self.dynamic_field: NDArray = np.zeros((width, height))
+
+        shape = (width, height)  # Same layout as the original np.zeros((width, height))
+        self.buffers: List[NDArray] = [np.zeros((shape[0] + 2, shape[1] + 2), dtype=dtype) for _ in range(2)]
+        self.current = 0
+
+        # Rows per strip, so that a strip of scratch fits in about 256 KiB of cache
+        self.block_rows = max(1, 2 ** 18 // (shape[1] * np.dtype(dtype).itemsize))
+        self.scratch: NDArray = np.empty((min(self.block_rows, shape[0]), shape[1]), dtype=dtype)
+
+        # Stencil weights grouped by value: shifted windows sharing a weight are
+        # summed first and multiplied once. Flipped as convolve does.
+        self.stencil: Dict[float, List[Tuple[int, int]]] = {}
+        for (i, j), weight in np.ndenumerate(kernel[::-1, ::-1]):
+            if weight:
+                self.stencil.setdefault(float(weight), []).append((i, j))
+
+        self.tile_size = tile_size
+        self.threshold = threshold
+        self.active: Optional[NDArray] = None
+        if tile_size is not None:
+            self.active = np.zeros((-(-shape[0] // tile_size), -(-shape[1] // tile_size)), dtype=bool)
+
+    @property
+    def dynamic_field(self) -> NDArray:
+        """Field values, a view of the interior of the current buffer."""
+        return self.buffers[self.current][1:-1, 1:-1]
+
+    @dynamic_field.setter
+    def dynamic_field(self, values: NDArray) -> None:
+        self.buffers[self.current][1:-1, 1:-1] = values
+        if self.active is not None:
+            self.active[:] = True
 
     def __getitem__(self, position: Position) -> float:
         """
@@ -54,43 +125,133 @@ class DynamicField:
             value: Value to set at the position
         """
         self.dynamic_field[position] = value
+        self.mark_active([position])
+
+    def mark_active(self, positions: Positions) -> None:
+        """
+        Mark the tiles holding some positions as active.
+
+        Args:
+            positions: List of (y, x) positions whose values were raised
+        """
+        if self.active is not None and len(positions):
+            tiles = np.asarray(positions).reshape(-1, 2) // self.tile_size
+            self.active[tiles[:, 0], tiles[:, 1]] = True
 
     def decay_and_diffuse(self) -> None:
         """
         Apply decay and diffusion to the dynamic field following Burstedde's model.
 
         Implements a three-step process:
-        1. Applies diffusion using convolution
+        1. Applies diffusion with the Moore stencil of utils.kernel
         2. Applies exponential decay
         3. Combines diffusion and decay effects according to equation 7 from
             Burstedde's paper
 
         Note:
-            Final values are clipped between 0 and 1
+            Final values are clipped between 0 and 1. Border cells see their
+            own values beyond the grid, as convolve's default 'reflect' mode.
         """
-        # Apply diffusion using convolution
-        diffused = convolve(self.dynamic_field , kernel)
+        source = self.buffers[self.current]
+        target = self.buffers[1 - self.current]
+        height, width = source.shape[0] - 2, source.shape[1] - 2
 
-        # Apply decay
-        self.dynamic_field = self.dynamic_field  * (1 - delta)
+        # Replicate the edges into the border
+        source[0, 1:-1], source[-1, 1:-1] = source[1, 1:-1], source[-2, 1:-1]
+        source[:, 0], source[:, -1] = source[:, 1], source[:, -2]
 
-        # Combine effects according to equation 7 from C. Burstedde Article
-        self.dynamic_field += (diffusion_coef * diffused)
+        if self.active is None:
+            self.diffuse_region(source, target, 0, height, 0, width)
+        else:
+            # Active tiles grown by one cell, merged along each row of tiles
+            size = self.tile_size
+            for tile_row in np.flatnonzero(self.active.any(axis=1)):
+                top, bottom = max(0, tile_row * size - 1), min(height, (tile_row + 1) * size + 1)
+                for start, end in get_runs(self.active[tile_row]):
+                    self.diffuse_region(source, target, top, bottom, max(0, start * size - 1),
+                                        min(width, end * size + 1))
 
-        # Clip values between 0 and 1
-        self.dynamic_field = np.clip(self.dynamic_field, 0, 1)
+        self.current = 1 - self.current
+
+        if self.active is not None:
+            self.update_active()
+
+    def diffuse_region(self, source: NDArray, target: NDArray, top: int, bottom: int, left: int, right: int) -> None:
+        """
+        Write the decayed and diffused values of a rectangle of cells.
+
+        Args:
+            source: Padded buffer holding the field, edges already replicated
+            target: Padded buffer receiving the new values
+            top: First row of the rectangle
+            bottom: Row after the last one
+            left: First column of the rectangle
+            right: Column after the last one
+        """
+        columns = right - left
+
+        # Work on strips of rows that stay in cache between the passes
+        for strip in range(top, bottom, self.block_rows):
+            rows = min(self.block_rows, bottom - strip)
+            result = target[1 + strip:1 + strip + rows, 1 + left:1 + right]
+            scratch = self.scratch[:rows, :columns]
+
+            # Apply decay
+            np.multiply(source[1 + strip:1 + strip + rows, 1 + left:1 + right], 1 - delta, out=result)
+
+            # Combine with diffusion according to equation 7 from C. Burstedde Article
+            for weight, offsets in self.stencil.items():
+                (i, j), *others = offsets
+                np.copyto(scratch, source[strip + i:strip + i + rows, left + j:left + j + columns])
+                for i, j in others:
+                    np.add(scratch, source[strip + i:strip + i + rows, left + j:left + j + columns], out=scratch)
+                np.multiply(scratch, diffusion_coef * weight, out=scratch)
+                np.add(result, scratch, out=result)
+
+            # Clip values between 0 and 1
+            np.clip(result, 0, 1, out=result)
+
+    def update_active(self) -> None:
+        """
+        Track which tiles hold values above the threshold after a step.
+
+        The halo cells written around active tiles may wake their neighbour
+        tiles. Tiles left at or below the threshold are zeroed in both
+        buffers, so that skipping them stays exact.
+        """
+        size = self.tile_size
+        field = self.dynamic_field
+        candidates = binary_dilation(self.active, structure=np.ones((3, 3), dtype=bool))
+
+        maxima = np.zeros(self.active.shape, dtype=field.dtype)
+        for tile_row in np.flatnonzero(candidates.any(axis=1)):
+            for start, end in get_runs(candidates[tile_row]):
+                block = field[tile_row * size:(tile_row + 1) * size, start * size:end * size]
+                maxima[tile_row, start:end] = np.maximum.reduceat(block.max(axis=0), np.arange(0, block.shape[1], size))
+
+        active = maxima > self.threshold
+        for tile_row, tile_column in np.argwhere(candidates & ~active & ((maxima > 0) | self.active)):
+            tile = (slice(1 + tile_row * size, 1 + (tile_row + 1) * size),
+                    slice(1 + tile_column * size, 1 + (tile_column + 1) * size))
+            self.buffers[0][tile] = 0
+            self.buffers[1][tile] = 0
+
+        self.active = active
 
     def update_dynamic_field(self, positions: Positions) -> None:
         """
         Update dynamic field based on pedestrian positions.
 
         Args:
-            positions: List of positions to update
+            positions: List or (N, 2) array of positions to update
 
         Note:
             Increments field value at each position and applies decay
         """
-        self.dynamic_field[tuple(zip(*positions))] += 1
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        if len(positions):
+            self.dynamic_field[positions[:, 0], positions[:, 1]] += 1
+            self.mark_active(positions)
         self.decay_and_diffuse()
 
     def get_neighbors_matrix(self, position: Position) -> NDArray:
@@ -111,20 +272,22 @@ class DynamicField:
              [(y,x-1),   (y,x),   (y,x+1)],
              [(y+1,x-1), (y+1,x), (y+1,x+1)]]
         """
-        y, x = position
-        neighbors = np.zeros((3, 3))
+        return self.get_neighbors_matrices([position])[0]
 
-        for j in range(3):
-            for i in range(3):
-                # Calculate actual position in original matrix
-                pos_y = y + (i - 1)  # -1, 0, 1
-                pos_x = x + (j - 1)  # -1, 0, 1
+    def get_neighbors_matrices(self, positions: Positions) -> NDArray:
+        """
+        Get the 3x3 neighbour matrices of many positions at once.
+
+        Args:
+            positions: List or (N, 2) array of (y, x) center positions
 
-                # Check if position is valid in original matrix
-                if 0 <= pos_y < self.height and 0 <= pos_x < self.width:
-                    neighbors[i, j] = self.dynamic_field[pos_y, pos_x]
+        Returns:
+            (N, 3, 3) array with the matrix of get_neighbors_matrix for each
+            position: centers and out-of-bounds cells set to 0
+        """
+        neighbors = gather_neighborhoods(self.dynamic_field, positions)
 
-        # Set center value to 0
-        neighbors[1, 1] = 0
+        # Set center values to 0
+        neighbors[:, 1, 1] = 0
 
-        return neighbors
\ No newline at end of file
+        return neighbors
@@ -1,8 +1,11 @@
-from typing import List, Tuple, Dict, Union
+from typing import List, Tuple, Dict, Union, Any, Optional
 import numpy as np
 import random
+from scipy import ndimage
 from Pedestrians import Pedestrian
-from utils import get_min_max
+from utils import get_min_max, congestion_threshold, congestion_radius
+from Matrix import gather_neighborhoods
+from .occupancy import OccupancyTable
 from numpy.typing import NDArray
 
 Position = Tuple[int, int]
@@ -25,6 +28,16 @@ class FloorField:
             1: Occupied by pedestrian
             2: Exit
             3: Wall
+        exits (List[Position]): Open exits
+        occupancy (OccupancyTable): Summed-area table of occupied cells
+        congestion_threshold (int): Occupied cells around a position above which it is congested
+        congestion_radius (int): Radius of the window counted for congestion
+        layout_version (int): Incremented whenever walls or exits change
+        doors (List[Position]): Room doors
+        room_labels (NDArray): Room id of every cell, 0 outside of any room
+        room_doors (NDArray): (R + 1, 2) door position of each room id, (-1, -1) for id 0
+        astar (Any): Array-backed A* engine, built by PathFinding on first search
+        hierarchy (Any): Hierarchical planner, built by PathFinding on first search
     """
 
     def __init__(self, width: int, height: int) -> None:
@@ -38,6 +51,17 @@ class FloorField:
         self.width = width
         self.height = height
         self.grid: NDArray = np.zeros((width, height))
+        self.exits: List[Position] = []
+        self.occupancy = OccupancyTable(self.grid)
+        self.congestion_threshold = congestion_threshold
+        self.congestion_radius = congestion_radius
+
+        self.layout_version: int = 0
+        self.doors: List[Position] = []
+        self.room_labels: NDArray = np.zeros(self.grid.shape, dtype=np.int32)
+        self.room_doors: NDArray = np.full((1, 2), -1, dtype=np.int32)
+        self.astar: Any = None
+        self.hierarchy: Any = None
 
     def __getitem__(self, position: Position) -> float:
         """
@@ -70,6 +94,8 @@ class FloorField:
         """
         for exit_coordinates in exits:
             self.grid[exit_coordinates] = 2
+            if tuple(exit_coordinates) not in self.exits:
+                self.exits.append(tuple(exit_coordinates))
 
     def add_walls(self, start_pos: Position, size: Size, door_pos: Position) -> None:
         """
@@ -93,6 +119,109 @@ class FloorField:
         door_y, door_x = door_pos
         self.grid[door_y, door_x] = 0
 
+        self.layout_version += 1
+
+    def add_obstacle(self, cells: List[Position]) -> List[Position]:
+        """
+        Turn free cells into walls during the simulation.
+
+        Args:
+            cells: Positions (y, x) to block
+
+        Returns:
+            Cells that became walls, to pass to StaticField.update_layout
+
+        Raises:
+            ValueError: If a cell holds a pedestrian or an exit (use close_exit)
+        """
+        blocked = []
+        for cell in map(tuple, cells):
+            if self.grid[cell] in (1, 2):
+                raise ValueError(f"Cell {cell} holds a {'pedestrian' if self.grid[cell] == 1 else 'exit'}")
+            if self.grid[cell] != 3:
+                self.grid[cell] = 3
+                blocked.append(cell)
+
+        if blocked:
+            self.layout_version += 1
+            self.relabel_rooms()
+
+        return blocked
+
+    def remove_obstacle(self, cells: List[Position]) -> List[Position]:
+        """
+        Turn walls back into free cells during the simulation.
+
+        Args:
+            cells: Positions (y, x) to free
+
+        Returns:
+            Cells that stopped being walls, to pass to StaticField.update_layout
+        """
+        unblocked = []
+        for cell in map(tuple, cells):
+            if self.grid[cell] == 3:
+                self.grid[cell] = 0
+                unblocked.append(cell)
+
+        if unblocked:
+            self.layout_version += 1
+            self.relabel_rooms()
+
+        return unblocked
+
+    def close_exit(self, exit: Position) -> List[Position]:
+        """
+        Close an exit, turning it into a wall.
+
+        Args:
+            exit: Exit position (y, x)
+
+        Returns:
+            The exit cell, which became a wall
+
+        Raises:
+            ValueError: If the position is not an open exit
+        """
+        exit = tuple(exit)
+        if exit not in self.exits:
+            raise ValueError(f"{exit} is not an open exit")
+
+        self.exits.remove(exit)
+        self.grid[exit] = 3
+        self.layout_version += 1
+        self.relabel_rooms()
+
+        return [exit]
+
+    def open_exit(self, exit: Position) -> List[Position]:
+        """
+        Open an exit, e.g. one closed before.
+
+        Args:
+            exit: Exit position (y, x)
+
+        Returns:
+            The exit cell if it was a wall, otherwise an empty list. Opening an
+            exit that is already open changes nothing, layout_version included.
+
+        Raises:
+            ValueError: If a pedestrian stands on the cell
+        """
+        exit = tuple(exit)
+        if self.grid[exit] == 1:
+            raise ValueError(f"Cell {exit} holds a pedestrian")
+
+        if exit in self.exits:
+            return []
+
+        unblocked = [exit] if self.grid[exit] == 3 else []
+        self.add_exit([exit])
+        self.layout_version += 1
+        self.relabel_rooms()
+
+        return unblocked
+
     def setup_rooms(self) -> List[RoomInfo]:
         """
         Create 3 rooms at specified positions.
@@ -141,8 +270,78 @@ class FloorField:
             'door': door3_pos
         })
 
+        self.label_rooms([room['door'] for room in rooms_info])
+
         return rooms_info
 
+    def label_rooms(self, doors: Optional[List[Position]] = None) -> None:
+        """
+        Label the rooms of the floor plan and the door of each room.
+
+        Rooms are the connected components of the free cells, doors excluded,
+        that touch a door and hold no exit, so they can have any shape.
+        Components holding an exit are the open floor and keep id 0.
+
+        Args:
+            doors: Door positions, the current ones if not given
+
+        Note:
+            A door cell itself is not inside its room. A room with several
+            doors is assigned the first one.
+        """
+        if doors is not None:
+            self.doors = [tuple(door) for door in doors]
+
+        free = self.grid != 3
+        for door in self.doors:
+            free[door] = False
+
+        # Pedestrians move diagonally, so rooms are 8-connected
+        labels, count = ndimage.label(free, structure=np.ones((3, 3), dtype=bool))
+
+        open_floor = np.zeros(count + 1, dtype=bool)
+        open_floor[0] = True
+        if self.exits:
+            open_floor[labels[tuple(np.transpose(self.exits))]] = True
+
+        # Component label -> room id, in order of the doors
+        room_ids = np.zeros(count + 1, dtype=np.int32)
+        room_doors = [(-1, -1)]
+
+        if self.doors:
+            neighbors = gather_neighborhoods(labels, self.doors).reshape(len(self.doors), 9)
+
+            for door, door_neighbors in zip(self.doors, neighbors):
+                for label in door_neighbors:
+                    if not open_floor[label] and not room_ids[label]:
+                        room_ids[label] = len(room_doors)
+                        room_doors.append(door)
+
+        self.room_labels = room_ids[labels]
+        self.room_doors = np.array(room_doors, dtype=np.int32)
+
+    def relabel_rooms(self) -> None:
+        """Refresh the room labels after a layout change, if there are rooms."""
+        if self.doors:
+            self.label_rooms()
+
+    def get_rooms(self, positions: List[Position]) -> Tuple[NDArray, NDArray]:
+        """
+        Get the room of many positions at once.
+
+        Args:
+            positions: List or (N, 2) array of (y, x) positions
+
+        Returns:
+            Tuple containing:
+                - (N,) room ids, 0 outside of any room
+                - (N, 2) door position of each room, (-1, -1) outside
+        """
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        room_ids = self.room_labels[positions[:, 0], positions[:, 1]]
+
+        return room_ids, self.room_doors[room_ids]
+
     def available_positions(self, num_pedestrians: int) -> List[Position]:
         """
         Find available positions for pedestrian placement.
@@ -158,53 +357,123 @@ class FloorField:
 
         return available_positions
 
-    def set_pedestrians(self, pedestrians: any, num_pedestrians: int) -> List[Pedestrian]:
+    def set_pedestrians(
+            self,
+            pedestrians: any,
+            num_pedestrians: int,
+            rng: Optional[np.random.Generator] = None
+    ) -> List[Pedestrian]:
         """
         Place pedestrians randomly in available positions.
 
         Args:
             pedestrians: Pedestrians collection object
             num_pedestrians: Number of pedestrians to place
+            rng: Random generator for the positions, the random module if not given
 
         Returns:
-            List of placed pedestrian objects
+            Views of the placed pedestrians
         """
         avaliable_positions = self.available_positions(num_pedestrians)
-        positions = random.sample(avaliable_positions, num_pedestrians)
+        if rng is None:
+            positions = random.sample(avaliable_positions, num_pedestrians)
+        else:
+            indices = rng.choice(len(avaliable_positions), num_pedestrians, replace=False)
+            positions = [avaliable_positions[index] for index in indices]
 
         for idx, position in enumerate(positions):
-            pedestrian = Pedestrian()
-            pedestrian.id = idx
-            pedestrian.position = position
+            pedestrians.add(position, idx)
 
             self.grid[position] = 1
 
-            pedestrians.info.append(pedestrian)
-            pedestrians.positions.append(pedestrian.position)
+        self.update_occupancy()
 
         return pedestrians.info
 
+    def update_occupancy(self) -> None:
+        """Refresh the occupancy table after pedestrians were placed or moved."""
+        self.occupancy.update(self.grid)
+
+    def get_moves_masks(self, positions: List[Position]) -> NDArray:
+        """
+        Get which of the 3x3 moves around many positions lead to a free cell.
+
+        Args:
+            positions: List or (N, 2) array of (y, x) positions
+
+        Returns:
+            (N, 3, 3) boolean array laid out as the moves matrix, False for
+            moves leaving the grid or into a wall or a pedestrian (including
+            the center, which the pedestrian occupies)
+        """
+        neighborhoods = gather_neighborhoods(self.grid, positions, fill=3)
+
+        return (neighborhoods != 3) & (neighborhoods != 1)
+
+    def get_congestion_map(self, threshold: Optional[int] = None, radius: Optional[int] = None) -> NDArray:
+        """
+        Get which cells of the grid are congested.
+
+        Args:
+            threshold: Number of occupied cells to consider congestion, the grid's if not given
+            radius: Radius of the counted window, the grid's if not given
+
+        Returns:
+            Boolean matrix, True where the number of occupied cells in the
+            window around the cell is above the threshold
+
+        Note:
+            The window counts are a box filter over the occupancy computed
+            once per step from the summed-area table and shared by all cells.
+        """
+        threshold = self.congestion_threshold if threshold is None else threshold
+        radius = self.congestion_radius if radius is None else radius
+
+        return self.occupancy.window_counts(radius) > threshold
+
+    def check_congestions(
+            self,
+            positions: List[Position],
+            threshold: Optional[int] = None,
+            radius: Optional[int] = None
+    ) -> NDArray:
+        """
+        Check the congestion around many positions at once.
+
+        Args:
+            positions: List or (N, 2) array of (y, x) positions
+            threshold: Number of occupied cells to consider congestion, the grid's if not given
+            radius: Radius to check neighborhood, the grid's if not given
+
+        Returns:
+            (N,) boolean array, same as calling check_congestion() for each position
+        """
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+
+        return self.get_congestion_map(threshold, radius)[positions[:, 0], positions[:, 1]]
+
     def check_congestion(
             self,
             position: Position,
-            threshold: int = 3,
-            radius: int = 2
+            threshold: Optional[int] = None,
+            radius: Optional[int] = None
     ) -> bool:
         """
         Check if there is congestion around a position.
 
         Args:
             position: Current position (y, x)
-            threshold: Number of occupied cells to consider congestion
-            radius: Radius to check neighborhood
+            threshold: Number of occupied cells to consider congestion, the grid's if not given
+            radius: Radius to check neighborhood, the grid's if not given
 
         Returns:
             True if number of occupied cells > threshold
         """
-        y_min, y_max, x_min, x_max = get_min_max(position, self.grid, radius)
+        threshold = self.congestion_threshold if threshold is None else threshold
+        radius = self.congestion_radius if radius is None else radius
 
         # Count occupied cells (value 1) in neighborhood
-        occupied_cells = np.sum(self.grid[y_min:y_max, x_min:x_max] == 1)
+        occupied_cells = self.occupancy.count(position, radius)
 
         return bool(occupied_cells > threshold)
 
@@ -0,0 +1,95 @@
+from typing import Dict, Tuple
+import numpy as np
+from numpy.typing import NDArray
+from utils import get_min_max
+
+Position = Tuple[int, int]
+
+
+class OccupancyTable:
+    """
+    Summed-area table of the cells occupied by pedestrians.
+
+    Answers "how many pedestrians are within radius of this cell" in constant
+    time, instead of slicing the grid and summing a window for every query.
+
+    Attributes:
+        table (NDArray): Integral image of the occupancy, shape (height + 1, width + 1)
+        occupied (NDArray): Boolean matrix of occupied cells
+        changed (NDArray): (y, x) cells whose occupancy changed in the last update
+        version (int): Incremented on every update
+    """
+
+    def __init__(self, cells: NDArray) -> None:
+        """
+        Build the table for a grid.
+
+        Args:
+            cells: Environment matrix where 1 marks a pedestrian
+        """
+        self.shape = cells.shape
+        self.table: NDArray = np.zeros((self.shape[0] + 1, self.shape[1] + 1), dtype=np.int32)
+        self.occupied: NDArray = np.zeros(self.shape, dtype=bool)
+        self.changed: NDArray = np.empty((0, 2), dtype=np.int64)
+        self.version: int = 0
+        self._window_counts: Dict[int, NDArray] = {}
+
+        self.update(cells)
+
+    def update(self, cells: NDArray) -> None:
+        """
+        Rebuild the table after pedestrians moved.
+
+        Args:
+            cells: Environment matrix where 1 marks a pedestrian
+        """
+        occupied = cells == 1
+        self.changed = np.argwhere(occupied != self.occupied)
+        self.occupied = occupied
+
+        np.cumsum(occupied, axis=0, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=1, out=self.table[1:, 1:])
+
+        self.version += 1
+        self._window_counts.clear()
+
+    def count(self, position: Position, radius: int) -> int:
+        """
+        Count occupied cells in the (2 * radius + 1)² window around a position.
+
+        Args:
+            position: Center position (y, x)
+            radius: Radius of the window
+
+        Returns:
+            Number of occupied cells, the window being clipped at the grid border
+        """
+        y_min, y_max, x_min, x_max = get_min_max(position, self, radius)
+        table = self.table
+
+        return int(table[y_max, x_max] - table[y_min, x_max] - table[y_max, x_min] + table[y_min, x_min])
+
+    def window_counts(self, radius: int) -> NDArray:
+        """
+        Count occupied cells around every cell of the grid.
+
+        Args:
+            radius: Radius of the window
+
+        Returns:
+            Matrix of counts, same as calling count() for each cell.
+            Cached until the next update.
+        """
+        if radius not in self._window_counts:
+            height, width = self.shape
+            rows = np.arange(height)
+            columns = np.arange(width)
+
+            y_min, y_max = np.maximum(rows - radius, 0)[:, None], np.minimum(rows + radius + 1, height)[:, None]
+            x_min, x_max = np.maximum(columns - radius, 0), np.minimum(columns + radius + 1, width)
+
+            table = self.table
+            self._window_counts[radius] = (table[y_max, x_max] - table[y_min, x_max]
+                                           - table[y_max, x_min] + table[y_min, x_min])
+
+        return self._window_counts[radius]
@@ -1,61 +1,360 @@
 from typing import List, Tuple, Dict, Any, Optional
 import random
 from PathFinding import *
+from utils import move_offsets, no_move, get_move_code, path_backend
+from Matrix import sample_categorical
 import numpy as np
 from numpy.typing import NDArray
 
 Position = Tuple[int, int]
 StaticFieldType = Dict[str, Any]
 
+
+class StaticFieldEntry:
+    """
+    Static field of one position towards one exit, read from the compact arrays.
+
+    Supports the dictionary keys returned by find_shortest_path ('initial position',
+    'exit', 'path', 'steps') plus 'next_move'. The full path is only rebuilt
+    when it is asked for.
+
+    Attributes:
+        field (StaticField): Static field holding the arrays
+        index (int): Index of the exit in field.targets
+        position (Position): Position the entry was read for
+    """
+    __slots__ = ('field', 'index', 'position')
+
+    def __init__(self, field: 'StaticField', index: int, position: Position) -> None:
+        """
+        Initialize an entry.
+
+        Args:
+            field: Static field holding the arrays
+            index: Index of the exit in field.targets
+            position: Position (y, x) the entry refers to
+        """
+        self.field = field
+        self.index = index
+        self.position = tuple(position)
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Enable dictionary style access using entry['key'] syntax.
+
+        Args:
+            key: One of 'initial position', 'exit', 'path', 'steps' or 'next_move'
+
+        Returns:
+            Value associated with the key
+        """
+        if key == 'initial position':
+            return self.position
+        if key == 'exit':
+            return self.field.targets[self.index]
+        if key == 'steps':
+            return float(self.field.steps[(self.index,) + self.position])
+        if key == 'next_move':
+            return int(self.field.next_moves[(self.index,) + self.position])
+        if key == 'path':
+            return self.field.get_full_path(self.index, self.position)
+
+        raise KeyError(key)
+
+
 class StaticField:
     """
     Manages static fields for pedestrian pathfinding.
 
     This class handles the calculation and selection of static fields that guide
-    pedestrians towards exits through the environment.
+    pedestrians towards exits through the environment. Fields are stored as one
+    move code and one step count per cell and exit instead of full paths.
 
     Attributes:
         width (int): Width of the environment grid
         height (int): Height of the environment grid
-        static_field (NDArray): Matrix storing static field values
+        targets (List[Position]): Exits and doors that have a field
+        next_moves (NDArray): int8 code of the next move towards each target,
+            shape (targets, height, width), no_move if there is none
+        steps (NDArray): float32 number of cells in the path to each target,
+            NaN where the field was not calculated yet
+        distances (Optional[NDArray]): float32 movement cost to each target, kept
+            for incremental repairs when the fields are precomputed
+        precomputed (bool): Whether the fields were computed for the whole grid
+        exit_probabilities (Optional[NDArray]): float32 (height, width, exits)
+            exit-choice distribution of every cell, built on first use
+        exit_probability_exits (Tuple[Position, ...]): Exits of exit_probabilities
+        path_finder (Callable): Pathfinding backend used when fields are not precomputed
     """
 
-    def __init__(self, width: int, height: int) -> None:
+    def __init__(self, width: int, height: int, backend: str = path_backend) -> None:
         """
         Initialize static field with given dimensions.
 
         Args:
             width: Width of the environment grid
             height: Height of the environment grid
+            backend: Pathfinding backend for per-cell fields ('astar', 'jps', 'hpa')
         """
         self.width = width
         self.height = height
+        self.path_finder = get_path_finder(backend)
+
+        self.targets: List[Position] = []
+        self.next_moves: NDArray = np.full((0, height, width), no_move, dtype=np.int8)
+        self.steps: NDArray = np.full((0, height, width), np.nan, dtype=np.float32)
+        self.distances: Optional[NDArray] = None
+        self.precomputed: bool = False
 
-        self.static_field = np.zeros((width, height), dtype=object)
+        self.exit_probabilities: Optional[NDArray] = None
+        self.exit_probability_exits: Tuple[Position, ...] = ()
 
-    def __getitem__(self, position: Position) -> Any:
+    def __getitem__(self, position: Position) -> List[StaticFieldEntry]:
         """
         Enable grid access using grid[y,x] syntax.
 
         Args:
-            position: Tuple of (x, y) coordinates
+            position: Tuple of (y, x) coordinates
 
         Returns:
-            Value at the specified position
+            Static fields calculated for the position, one per target
         """
-        x, y = position
-        return self.static_field[x, y]
+        return [StaticFieldEntry(self, index, position) for index in range(len(self.targets))
+                if not np.isnan(self.steps[(index,) + tuple(position)])]
 
-    def __setitem__(self, position: Position, value: Any) -> None:
+    def __setitem__(self, position: Position, value: List[StaticFieldType]) -> None:
         """
         Enable grid modification using grid[y,x] = value syntax.
 
         Args:
-            position: Tuple of (x, y) coordinates
-            value: Value to set at the position
+            position: Tuple of (y, x) coordinates
+            value: List of find_shortest_path results starting at the position
+        """
+        for static_field_ij in value:
+            self.store_path(static_field_ij['exit'], position, static_field_ij['path'])
+
+    def get_target_index(self, target: Position) -> int:
+        """
+        Get the layer of a target in the field arrays, adding it if needed.
+
+        Args:
+            target: Exit or door position
+
+        Returns:
+            Index of the target in targets
+        """
+        target = tuple(target)
+        if target not in self.targets:
+            self.targets.append(target)
+            shape = (1,) + self.steps.shape[1:]
+            self.next_moves = np.concatenate([self.next_moves, np.full(shape, no_move, dtype=np.int8)])
+            self.steps = np.concatenate([self.steps, np.full(shape, np.nan, dtype=np.float32)])
+            if self.distances is not None:
+                self.distances = np.concatenate([self.distances, np.full(shape, np.inf, dtype=np.float32)])
+
+        return self.targets.index(target)
+
+    def store_path(self, target: Position, position: Position, path: List[Position]) -> None:
+        """
+        Store a path as move codes and step counts.
+
+        Args:
+            target: Exit or door the path leads to
+            position: Starting position of the path
+            path: List of positions from position to target, empty if unreachable
+
+        Note:
+            Every cell on the path that has no field yet gets one, so later
+            pedestrians walking the same path do not trigger a new search.
+        """
+        index = self.get_target_index(target)
+        steps, next_moves = self.steps[index], self.next_moves[index]
+
+        if not path:
+            steps[position] = np.inf
+            return
+
+        if np.isnan(steps[path[-1]]):
+            steps[path[-1]] = 1
+
+        for cell, next_cell in reversed(list(zip(path, path[1:]))):
+            if np.isnan(steps[cell]):
+                next_moves[cell] = get_move_code((next_cell[0] - cell[0], next_cell[1] - cell[1]))
+                steps[cell] = steps[next_cell] + 1
+
+    def get_full_path(self, index: int, position: Position) -> List[Position]:
+        """
+        Rebuild the full path from a position by following the move codes.
+
+        Args:
+            index: Index of the target in targets
+            position: Starting position (y, x)
+
+        Returns:
+            List of positions from position to the target, empty if the
+            target cannot be reached
+        """
+        if not np.isfinite(self.steps[(index,) + tuple(position)]):
+            return []
+
+        path = [tuple(position)]
+        code = self.next_moves[(index,) + path[-1]]
+        while code != no_move:
+            dy, dx = move_offsets[code]
+            path.append((path[-1][0] + int(dy), path[-1][1] + int(dx)))
+            code = self.next_moves[(index,) + path[-1]]
+
+        return path
+
+    def precompute(
+            self,
+            grid: NDArray,
+            exits: List[Position],
+            doors: List[Position] = (),
+            store: Any = None
+    ) -> None:
+        """
+        Calculate the static field of every cell to every exit and door at once.
+
+        Args:
+            grid: Environment grid
+            exits: List of exit positions
+            doors: List of room door positions
+            store: Optional StaticFieldStore to load the fields from, or save them to
+
+        Note:
+            Runs one Dijkstra flood fill per target instead of one A* search
+            per cell and exit. Afterwards every lookup is an array index.
+            Fields loaded from the store are read-only memory maps.
+        """
+        self.targets = [tuple(target) for target in exits] + [tuple(door) for door in doors if door not in exits]
+        self.precomputed = True
+        self.exit_probabilities = None
+
+        key = store.layout_key(grid, self.targets) if store is not None else None
+        stored = store.load(key) if store is not None else None
+
+        if stored is not None:
+            self.distances, self.next_moves, self.steps = stored
+            return
+
+        distances, self.next_moves, self.steps = distance_fields(grid, self.targets)
+        self.distances = distances.astype(np.float32)
+
+        if store is not None:
+            store.save(key, self.distances, self.next_moves, self.steps)
+
+    def make_writable(self) -> None:
+        """Copy fields memory-mapped from the store before changing them."""
+        # Every caller changes the fields, which outdates the exit-choice maps
+        self.exit_probabilities = None
+
+        if not self.steps.flags.writeable:
+            self.next_moves, self.steps = np.array(self.next_moves), np.array(self.steps)
+            if self.distances is not None:
+                self.distances = np.array(self.distances)
+
+    def add_target(self, grid: NDArray, target: Position) -> int:
+        """
+        Add an exit or door during the simulation.
+
+        Args:
+            grid: Environment grid with the new layout
+            target: Exit or door position
+
+        Returns:
+            Index of the target in targets
+
+        Note:
+            When the fields are precomputed, the field of the new target is
+            computed for the whole grid at once.
+        """
+        index = self.get_target_index(target)
+
+        if self.precomputed:
+            self.make_writable()
+            distances, next_moves, steps = distance_fields(grid, [tuple(target)])
+            self.distances[index], self.next_moves[index], self.steps[index] = distances[0], next_moves[0], steps[0]
+
+        return index
+
+    def remove_target(self, target: Position) -> None:
+        """
+        Drop the field of an exit or door, e.g. when an exit is closed.
+
+        Args:
+            target: Exit or door position
         """
-        x, y = position
-        self.static_field[x, y] = value
+        index = self.targets.index(tuple(target))
+        del self.targets[index]
+        self.exit_probabilities = None
+
+        self.next_moves = np.delete(self.next_moves, index, axis=0)
+        self.steps = np.delete(self.steps, index, axis=0)
+        if self.distances is not None:
+            self.distances = np.delete(self.distances, index, axis=0)
+
+    def update_layout(
+            self,
+            grid: NDArray,
+            blocked: List[Position] = (),
+            unblocked: List[Position] = ()
+    ) -> int:
+        """
+        Repair the fields after walls were added or removed during the simulation.
+
+        Args:
+            grid: Environment grid with the new layout
+            blocked: Cells that became walls
+            unblocked: Cells that stopped being walls
+
+        Returns:
+            Number of field cells that were updated
+
+        Note:
+            Precomputed fields are repaired in place, only around the cells
+            whose paths changed (see repair_distance_field). Fields computed
+            per cell are dropped where they may be outdated and searched
+            again when a pedestrian needs them.
+        """
+        if not len(blocked) and not len(unblocked):
+            return 0
+
+        self.make_writable()
+        walls = np.asarray(getattr(grid, 'grid', grid)) == 3
+        updated = 0
+
+        for index, target in enumerate(self.targets):
+            if self.precomputed:
+                updated += repair_distance_field(walls, target, self.distances[index], self.next_moves[index],
+                                                 self.steps[index], blocked, unblocked)
+                continue
+
+            # A free cell can shorten any path, a wall only the paths through it
+            if len(unblocked):
+                outdated = np.ones(walls.shape, dtype=bool)
+            else:
+                roots = [y * walls.shape[1] + x for y, x in blocked]
+                outdated = get_subtree(self.next_moves[index].ravel(), roots, walls.shape[1]).reshape(walls.shape)
+
+            updated += int(np.count_nonzero(~np.isnan(self.steps[index][outdated])))
+            self.steps[index][outdated] = np.nan
+            self.next_moves[index][outdated] = no_move
+
+        return updated
+
+    def get_field(self, position: Position, target: Position) -> StaticFieldEntry:
+        """
+        Get the static field of a position towards a given exit or door.
+
+        Args:
+            position: Current position
+            target: Exit or door position
+
+        Returns:
+            Static field leading from position to target
+        """
+        return StaticFieldEntry(self, self.get_target_index(target), position)
 
     def set_static_field_ij(self, grid: NDArray, position: Position, exits: List[Position]) -> None:
         """
@@ -67,64 +366,130 @@ class StaticField:
             exits: List of exit positions
 
         Note:
-            Only calculates if the position hasn't been calculated before
+            Only calculates the exits that weren't calculated before for the position.
+            Does nothing when the fields were precomputed.
         """
-        if self.static_field[position] == 0:
-            static_fields_ij = []
-
-            # Return steps, positions and number of steps to desired exit
-            for exit in exits:
-                static_field_ij = find_shortest_path(grid, exit, position)
-                static_fields_ij.append(static_field_ij)
+        if self.precomputed:
+            return
 
-            self.static_field[position] = static_fields_ij
+        # Return steps, positions and number of steps to desired exit
+        for exit in exits:
+            index = self.get_target_index(exit)
+            if np.isnan(self.steps[(index,) + tuple(position)]):
+                static_field_ij = find_shortest_path(grid, exit, position, self.path_finder)
+                self.store_path(exit, position, static_field_ij['path'])
 
-    def prob_field_Sij(self, position: Position, len_exits: int) -> List[float]:
+    def prob_field_Sij(self, position: Position, exits: List[Position]) -> List[float]:
         """
         Calculate probabilities for each static field at a position.
 
         Args:
             position: Position to calculate probabilities for
-            len_exits: Number of exits
+            exits: List of exit positions
 
         Returns:
             List of normalized probabilities for each static field
         """
-        possible_steps_to_exit = list(map(lambda x: x['steps'], self.static_field[position]))
-        sum_static_field_ij = sum(possible_steps_to_exit)
+        if self.precomputed:
+            return [float(prob) for prob in self.get_exit_probabilities(exits)[tuple(position)]]
 
-        probsSx = []
-        probsSx_ = []
+        indices = [self.get_target_index(exit) for exit in exits]
 
-        # Probability of cell at position (ij) having Sij(wp) as its SF
-        for i in range(len_exits):
-            probSx = (1 / self.static_field[position][i]['steps'] / (1 / sum_static_field_ij))  # Função 3 do artigo
-            probsSx.append(probSx)
+        return list(inverse_steps_probabilities(self.steps[(indices,) + tuple(position)].astype(float)))
 
-        sum_probs = sum(probsSx)
+    def get_exit_probabilities(self, exits: List[Position]) -> NDArray:
+        """
+        Get the exit-choice distribution of every cell of the grid.
 
-        for i in probsSx:
-            probSx_ = i / sum_probs
-            probsSx_.append(probSx_)
+        Args:
+            exits: List of exit positions
 
-        return list(probsSx_)
+        Returns:
+            float32 (height, width, exits) array of the probability of each
+            exit, zero for every exit where none can be reached
+
+        Note:
+            Needs precomputed fields. The array is built once and kept until
+            the exits or the fields change.
+        """
+        exits = tuple(tuple(exit) for exit in exits)
+
+        if self.exit_probabilities is None or exits != self.exit_probability_exits:
+            indices = [self.get_target_index(exit) for exit in exits]
+            steps = np.moveaxis(self.steps[indices], 0, -1)
+            self.exit_probabilities = inverse_steps_probabilities(steps).astype(np.float32)
+            self.exit_probability_exits = exits
+
+        return self.exit_probabilities
+
+    def select_exits(
+            self,
+            positions: NDArray,
+            exits: List[Position],
+            grid: NDArray,
+            rng: np.random.Generator
+    ) -> List[Optional[Position]]:
+        """
+        Draw an exit for many positions at once, weighted by the inverse of the steps to each exit.
+
+        Args:
+            positions: (N, 2) array of (y, x) positions
+            exits: List of exit positions
+            grid: Environment grid
+            rng: Random generator used for the draw
+
+        Returns:
+            Chosen exit of each position, None where no exit can be reached
+        """
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        if not len(positions) or not len(exits):
+            return []
+
+        if self.precomputed:
+            probabilities = self.get_exit_probabilities(exits)[positions[:, 0], positions[:, 1]]
+        else:
+            for y, x in positions:
+                self.set_static_field_ij(grid, (int(y), int(x)), exits)
+
+            indices = [self.get_target_index(exit) for exit in exits]
+            steps = self.steps[indices][:, positions[:, 0], positions[:, 1]].T
+            probabilities = inverse_steps_probabilities(steps.astype(float))
+
+        # Rows without any reachable exit have nothing to draw from
+        reachable = probabilities.sum(axis=1) > 0
+        chosen: List[Optional[Position]] = [None] * len(positions)
+
+        if reachable.any():
+            choices, _ = sample_categorical(probabilities[reachable], rng)
+            for row, choice in zip(np.flatnonzero(reachable), choices):
+                chosen[row] = tuple(exits[choice])
+
+        return chosen
 
     def select_static_field(
             self,
             position: Position,
-            prob_field_sij: List[float]
-    ) -> List[StaticFieldType]:
+            exits: List[Position],
+            prob_field_sij: List[float],
+            rng: Optional[np.random.Generator] = None
+    ) -> List[StaticFieldEntry]:
         """
         Select a static field based on calculated probabilities.
 
         Args:
             position: Current position
+            exits: List of exit positions
             prob_field_sij: List of probabilities for each field
+            rng: Random generator for the draw, the random module if not given
 
         Returns:
             Selected static field based on probabilities
         """
-        return random.choices(self.static_field[position], prob_field_sij)
+        if rng is None:
+            exit = random.choices(exits, prob_field_sij)[0]
+        else:
+            exit = exits[int(sample_categorical(np.array([prob_field_sij]), rng)[0][0])]
+        return [self.get_field(position, exit)]
 
     def get_static_field(
             self,
@@ -132,8 +497,9 @@ class StaticField:
             door_position: Optional[Position],
             pedestrian: Any,
             exits: List[Position],
-            grid: NDArray
-    ) -> Tuple[StaticFieldType, Any]:
+            grid: NDArray,
+            rng: Optional[np.random.Generator] = None
+    ) -> Tuple[StaticFieldEntry, Any]:
         """
         Get appropriate static field for a pedestrian based on their situation.
 
@@ -143,39 +509,67 @@ class StaticField:
             pedestrian: Pedestrian object
             exits: List of available exits
             grid: Environment grid
+            rng: Random generator for the exit choice, the random module if not given
 
         Returns:
             Tuple containing:
                 - Selected static field
                 - Updated pedestrian object
 
+        Raises:
+            ValueError: If no exit can be reached and the pedestrian has no target yet
+
         Note:
-            Updates pedestrian's chosen exit if necessary
+            Updates pedestrian's chosen exit if necessary. Where no open exit
+            can be reached, the pedestrian keeps its current target.
         """
         if inside_room:
             self.set_static_field_ij(grid, pedestrian.position, [door_position])
 
+            selected_static_field = self.get_field(pedestrian.position, door_position)
+
             if pedestrian.chosen_exit == None:
-                selected_static_field = self.static_field[pedestrian.position][0]
                 pedestrian.chosen_exit = selected_static_field['exit']
-            else:
-                selected_static_field = self.static_field[pedestrian.position][0]
         else:
-            # Assign static field values based on current pedestrian position
-            self.set_static_field_ij(grid, pedestrian.position, exits)
-
-            # Calculate probability for each static field based on distance to exit
-            prob = self.prob_field_Sij(pedestrian.position, len(exits))
-
             if pedestrian.chosen_exit == None or (pedestrian.chosen_exit not in exits and not inside_room):
-
-                # Select static field based on probabilities
-                selected_static_field = self.select_static_field(pedestrian.position, prob)[0]
-                pedestrian.chosen_exit = selected_static_field['exit']
+                # Assign static field values based on current pedestrian position
+                self.set_static_field_ij(grid, pedestrian.position, exits)
+
+                # Calculate probability for each static field based on distance to exit
+                prob = self.prob_field_Sij(pedestrian.position, exits)
+
+                if sum(prob) > 0:
+                    # Select static field based on probabilities
+                    selected_static_field = self.select_static_field(pedestrian.position, exits, prob, rng)[0]
+                    pedestrian.chosen_exit = selected_static_field['exit']
+                elif pedestrian.chosen_exit == None:
+                    raise ValueError(f"No exit can be reached from position {tuple(pedestrian.position)}")
+                else:
+                    # No open exit can be reached: keep heading to the current target
+                    self.set_static_field_ij(grid, pedestrian.position, [pedestrian.chosen_exit])
+                    selected_static_field = self.get_field(pedestrian.position, pedestrian.chosen_exit)
 
             else:
-                selected_static_field = [field for field in self.static_field[pedestrian.position] if field['exit'] == pedestrian.chosen_exit][0]
+                self.set_static_field_ij(grid, pedestrian.position, [pedestrian.chosen_exit])
+                selected_static_field = self.get_field(pedestrian.position, pedestrian.chosen_exit)
 
         return selected_static_field, pedestrian
 
 
+def inverse_steps_probabilities(steps: NDArray) -> NDArray:
+    """
+    Weigh exits by the inverse of the number of steps to reach them.
+
+    Probability of the cell having Sij(wp) as its static field, Function 3
+    of the article. The 1 / sum(steps) factor cancels out on normalization.
+
+    Args:
+        steps: Steps to each exit along the last axis, infinity if unreachable
+
+    Returns:
+        Probabilities along the last axis, all zero where no exit can be reached
+    """
+    weights = 1 / steps
+    totals = weights.sum(axis=-1, keepdims=True)
+
+    return np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
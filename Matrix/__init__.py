@@ -1,4 +1,5 @@
 from .matrix_operations import *
-from .preference_matrix import PreferenceMatrix
+from .preference_matrix import PreferenceMatrix, preference_table
 
-__all__ = ['PreferenceMatrix']
\ No newline at end of file
+__all__ = ['PreferenceMatrix', 'preference_table', 'normalize_matrix', 'gather_neighborhoods', 'transition_probabilities',
+           'sample_categorical', 'sample_moves']
\ No newline at end of file
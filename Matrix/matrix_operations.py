@@ -1,5 +1,8 @@
+from typing import Tuple
 import numpy as np
-from numpy.typing import NDArray
+from numpy.typing import NDArray, ArrayLike
+from utils import move_offsets
+from .preference_matrix import preference_table
 
 
 def normalize_matrix(matrix: NDArray) -> NDArray:
@@ -22,4 +25,115 @@ def normalize_matrix(matrix: NDArray) -> NDArray:
 
     matrix[matrix == 1] = 0
 
-    return matrix / np.sum(matrix)
\ No newline at end of file
+    return matrix / np.sum(matrix)
+
+
+def gather_neighborhoods(array: NDArray, positions: ArrayLike, fill: float = 0) -> NDArray:
+    """
+    Get the 3x3 neighbourhoods of many positions at once.
+
+    Args:
+        array: 2D matrix to read from
+        positions: (N, 2) array of (y, x) positions
+        fill: Value of the cells outside the matrix
+
+    Returns:
+        (N, 3, 3) array where entry [n, i, j] holds the value at
+        positions[n] + (i - 1, j - 1), laid out as the moves matrix
+    """
+    positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+    height, width = array.shape
+
+    ys = positions[:, 0, None] + move_offsets[:, 0]
+    xs = positions[:, 1, None] + move_offsets[:, 1]
+    inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+
+    neighborhoods = array[np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)]
+    neighborhoods[~inside] = fill
+
+    return neighborhoods.reshape(-1, 3, 3)
+
+
+def transition_probabilities(
+        move_codes: ArrayLike,
+        dynamic_field_neighbors: NDArray,
+        free_masks: NDArray
+) -> NDArray:
+    """
+    Compute the move probabilities of the whole crowd at once.
+
+    Batched version of PreferenceMatrix.get_matrix followed by normalization:
+    each pedestrian weighs the 9 moves by exp(dynamic field + rotated
+    preference), with blocked moves masked out before normalizing.
+
+    Args:
+        move_codes: (N,) codes of the best move of each pedestrian (see utils.move_offsets)
+        dynamic_field_neighbors: (N, 3, 3) dynamic field values around each pedestrian
+        free_masks: (N, 3, 3) boolean masks of the moves leading to a free cell
+
+    Returns:
+        (N, 9) probabilities in moves matrix order, each row summing to 1.
+        Pedestrians whose every move is blocked stay in place with probability 1.
+    """
+    count = len(dynamic_field_neighbors)
+    logits = (np.asarray(dynamic_field_neighbors, dtype=np.float64).reshape(count, 9)
+              + preference_table.reshape(-1, 9)[np.asarray(move_codes, dtype=np.intp)])
+    free = np.asarray(free_masks, dtype=bool).reshape(count, 9)
+
+    weights = np.exp(logits, where=free, out=np.zeros((count, 9)))
+    totals = weights.sum(axis=1, keepdims=True)
+
+    # Stay (move code 4) when nothing else is possible
+    jammed = totals[:, 0] == 0
+    weights[jammed, 4] = totals[jammed, 0] = 1
+
+    return np.divide(weights, totals, out=weights)
+
+
+def sample_categorical(probabilities: NDArray, rng: np.random.Generator) -> Tuple[NDArray, NDArray]:
+    """
+    Draw one category per row by inverse CDF sampling.
+
+    Args:
+        probabilities: (N, K) category weights. Rows need not be normalized
+            but must have a positive sum.
+        rng: Random generator used for the single uniform draw
+
+    Returns:
+        Tuple containing:
+            - (N,) index of the chosen category of each row
+            - (N,) normalized probability of each chosen category
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float64)
+    rows = np.arange(len(probabilities))
+    last_index = probabilities.shape[1] - 1
+
+    cumulative = np.cumsum(probabilities, axis=1)
+    totals = cumulative[:, -1]
+    draws = rng.random(len(probabilities)) * totals
+
+    # First category whose cumulative weight exceeds the draw. Rounding can put
+    # the draw on the total itself: fall back to the last category with a weight
+    indices = np.argmax(cumulative > draws[:, None], axis=1)
+    last = last_index - np.argmax(probabilities[:, ::-1] > 0, axis=1)
+    indices = np.where(cumulative[rows, indices] > draws, indices, last)
+
+    return indices, probabilities[rows, indices] / totals
+
+
+def sample_moves(probabilities: NDArray, rng: np.random.Generator) -> Tuple[NDArray, NDArray]:
+    """
+    Draw one move per pedestrian by inverse CDF sampling.
+
+    Args:
+        probabilities: (N, 9) move weights in moves matrix order, zero for
+            blocked moves. Rows need not be normalized but must have a
+            positive sum.
+        rng: Random generator used for the single uniform draw
+
+    Returns:
+        Tuple containing:
+            - (N,) codes of the chosen moves (see utils.move_offsets)
+            - (N,) normalized probability of each chosen move
+    """
+    return sample_categorical(np.reshape(probabilities, (-1, 9)), rng)
@@ -1,5 +1,5 @@
 from typing import List, Tuple, Union, Any
-from utils import preference_matrix
+from utils import preference_matrix, move_offsets, get_move_code
 import numpy as np
 from numpy.typing import NDArray
 import random
@@ -143,15 +143,20 @@ class PreferenceMatrix:
             dynamic_field_neighbors: Dynamic field values for neighboring cells
 
         Note:
-            - Rotates matrix based on preferred movement
+            - Looks up the matrix rotated towards the preferred movement
             - Combines static and dynamic field influences
             - Normalizes final matrix
         """
-        # Rotate matrix based on preferred movement
-        self.matrix = self.rotate_matrix(prefered_next_move)
+        # Rotated and scaled matrix of the preferred movement
+        rotated_matrix = preference_table[get_move_code(prefered_next_move)]
 
         # Calculate preference matrix values considering static and dynamic fields
-        self.matrix = np.exp(dynamic_field_neighbors) * np.exp(np.array(self.matrix) * 5)
+        self.matrix = np.exp(dynamic_field_neighbors + rotated_matrix)
 
         # Normalize preference matrix so probability sum never exceeds 1
         self.normalize_matrix()
+
+
+# Rotations of the preference matrix scaled by 5, indexed by move code (see utils.move_offsets)
+preference_table: MatrixType = 5 * np.array([PreferenceMatrix().rotate_matrix(tuple(int(d) for d in move))
+                                             for move in move_offsets], dtype=np.float64)
@@ -1,15 +1,32 @@
 from .astar import (
     find_path,
+    find_path_jps,
     find_shortest_path,
-    get_path,
+    get_next_move,
     get_movement_cost,
     check_congestion,
-    euclidean_distance
+    euclidean_distance,
+    get_path_cost
 )
+from .distance_field import distance_fields, get_subtree, repair_distance_field
+from .grid_astar import GridAStar
+from .congestion_field import CongestionField
+from .hierarchical import HierarchicalPlanner, find_path_hierarchical
+from .backends import get_path_finder
 
 __all__ = ['find_path',
+    'find_path_jps',
     'find_shortest_path',
-    'get_path',
+    'get_next_move',
     'get_movement_cost',
     'check_congestion',
-    'euclidean_distance']
\ No newline at end of file
+    'euclidean_distance',
+    'get_path_cost',
+    'distance_fields',
+    'get_subtree',
+    'repair_distance_field',
+    'GridAStar',
+    'CongestionField',
+    'HierarchicalPlanner',
+    'find_path_hierarchical',
+    'get_path_finder']
\ No newline at end of file
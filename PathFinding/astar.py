@@ -1,7 +1,7 @@
-from typing import Dict, List, Tuple, Optional, Any
-from heapq import heappush, heappop
+from typing import Dict, List, Tuple, Optional, Any, Callable
 from Pedestrians.pedestrian import Pedestrian
-from utils import get_min_max
+from utils import get_min_max, orthogonal_cost, diagonal_cost, get_congestion_settings
+from .grid_astar import GridAStar, occupied_counts, CONGESTION_COST
 import numpy as np
 from numpy.typing import NDArray
 
@@ -22,29 +22,49 @@ def euclidean_distance(p1: Position, p2: Position) -> float:
     """
     return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
 
+def count_occupied(grid: Any, position: Position, radius: int) -> int:
+    """
+    Count occupied cells in the neighbourhood of a position.
+
+    Args:
+        grid: Environment matrix, or FloorField to use its occupancy table
+        position: Center position as (y, x)
+        radius: Radius of the neighbourhood
+
+    Returns:
+        int: Number of cells with a pedestrian. Constant time for a FloorField.
+    """
+    occupancy = getattr(grid, 'occupancy', None)
+    if occupancy is not None:
+        return occupancy.count(position, radius)
+
+    y_min, y_max, x_min, x_max = get_min_max(position, grid, radius)
+
+    return int(np.sum(grid[y_min:y_max, x_min:x_max] == 1))
+
 def check_congestion(
     grid: GridType,
     position: Position,
-    threshold: int = 3,
-    radius: int = 2
+    threshold: Optional[int] = None,
+    radius: Optional[int] = None
 ) -> bool:
    """
    Check if there is congestion around a position.
 
     Args:
-        grid: Environment matrix
+        grid: Environment matrix, or FloorField to use its occupancy table
         position: Current position as (y, x) tuple
-        threshold: Number of occupied cells to consider congestion
-        radius: Radius to check neighborhood
+        threshold: Number of occupied cells to consider congestion, the grid's if not given
+        radius: Radius to check neighborhood, the grid's if not given
 
     Returns:
         bool: True if number of occupied cells > threshold
    """
-   y_min, y_max, x_min, x_max = get_min_max(position, grid, radius)
-
-   occupied_cells = np.sum(grid[y_min:y_max, x_min:x_max] == 1)
+   grid_threshold, grid_radius = get_congestion_settings(grid)
+   threshold = grid_threshold if threshold is None else threshold
+   radius = grid_radius if radius is None else radius
 
-   return bool(occupied_cells > threshold)
+   return bool(count_occupied(grid, position, radius) > threshold)
 
 
 def get_movement_cost(
@@ -52,7 +72,7 @@ def get_movement_cost(
     current: Position,
     neighbor: Position,
     grid: GridType,
-    radius: int = 2
+    radius: Optional[int] = None
 ) -> float:
     """
     Calculate movement cost considering walls and congestion.
@@ -61,7 +81,8 @@ def get_movement_cost(
         congestion: Whether to consider congestion in cost calculation
         current: Current position as (y, x)
         neighbor: Neighbor position as (y, x)
-        grid: Environment matrix
+        grid: Environment matrix, or FloorField to use its occupancy table
+        radius: Radius of the counted neighbourhood, the grid's congestion radius if not given
 
     Returns:
         float: Movement cost (infinity for walls)
@@ -72,17 +93,15 @@ def get_movement_cost(
     dy = abs(current[0] - neighbor[0])
     dx = abs(current[1] - neighbor[1])
 
-    base_cost = 1.4 if dx and dy else 1.0
+    base_cost = diagonal_cost if dx and dy else orthogonal_cost
     congestion_cost = 0
 
     if congestion:
-        y_min, y_max, x_min, x_max = get_min_max(neighbor, grid, radius)
-
-        neighborhood = grid[y_min:y_max, x_min:x_max]
-        occupied_cells = np.sum(neighborhood == 1)
-
+        if radius is None:
+            _, radius = get_congestion_settings(grid)
+        occupied_cells = count_occupied(grid, neighbor, radius)
 
-        congestion_cost = occupied_cells * 0.7
+        congestion_cost = occupied_cells * CONGESTION_COST
 
     return base_cost + congestion_cost
 
@@ -95,6 +114,9 @@ def find_path(
     """
     Implement A* pathfinding avoiding walls.
 
+    Runs on the array-backed GridAStar engine of the grid, which is built
+    once per floor layout and reused by every search.
+
     Args:
         grid: Environment matrix
         start: Starting position as (y, x)
@@ -105,43 +127,60 @@ def find_path(
         List of positions representing the path from start to goal.
         Empty list if no path is found.
     """
-    open_set = [(0, start)]
-    came_from = {}
+    engine = GridAStar.for_grid(grid)
+    occupied = occupied_counts(grid) if consider_congestion else None
 
-    g_score = {start: 0}
-    f_score = {start: euclidean_distance(start, goal)}
+    return engine.find_path(start, goal, occupied)
 
-    while open_set:
-        current = heappop(open_set)[1]
+def find_path_jps(
+    grid: GridType,
+    start: Position,
+    goal: Position,
+    consider_congestion: bool
+) -> Path:
+    """
+    Implement Jump Point Search pathfinding avoiding walls.
 
-        if current == goal:
-            path = []
-            while current in came_from:
-                path.append(current)
-                current = came_from[current]
-            path.append(start)
-            path.reverse()
-            return path
+    Same result format as find_path. Jump Point Search needs uniform move
+    costs, so congested searches fall back to A*.
 
-        for neighbor in Pedestrian.get_neighbors(current, grid):
-            # Skip if it's a wall
-            if grid[neighbor] == 3:
-                continue
+    Args:
+        grid: Environment matrix
+        start: Starting position as (y, x)
+        goal: Goal position as (y, x)
+        consider_congestion: Whether to consider congestion in pathfinding
+
+    Returns:
+        List of positions representing the path from start to goal.
+        Empty list if no path is found.
+    """
+    if consider_congestion:
+        return find_path(grid, start, goal, consider_congestion)
 
-            tentative_g_score = g_score[current] + get_movement_cost(consider_congestion, current, neighbor, grid.grid)
+    return GridAStar.for_grid(grid).find_path_jps(start, goal)
 
-            if neighbor not in g_score or tentative_g_score < g_score[neighbor]:
-                came_from[neighbor] = current
-                g_score[neighbor] = tentative_g_score
-                f_score[neighbor] = tentative_g_score + euclidean_distance(neighbor, goal)
-                heappush(open_set, (f_score[neighbor], neighbor))
+def get_path_cost(path: Path, grid: GridType, congestion: bool) -> float:
+    """
+    Calculate the total movement cost of a path.
+
+    Args:
+        path: List of positions
+        grid: Environment matrix, or FloorField to use its occupancy table
+        congestion: Whether to include congestion costs
+
+    Returns:
+        float: Sum of the movement costs, infinity for an empty path
+    """
+    if not path:
+        return float('inf')
 
-    return []
+    return sum(get_movement_cost(congestion, current, neighbor, grid) for current, neighbor in zip(path, path[1:]))
 
 def find_shortest_path(
     grid: GridType,
     exit: Position,
-    start: Position
+    start: Position,
+    path_finder: Optional[Callable] = None
 ) -> Dict[str, Any]:
    """
    Find the shortest path from starting point to exit.
@@ -150,6 +189,7 @@ def find_shortest_path(
         grid: Environment matrix
         exit: Exit position as (y, x)
         start: Starting position as (y, x)
+        path_finder: Backend with the find_path signature, find_path by default
 
     Returns:
         Dictionary containing:
@@ -163,40 +203,39 @@ def find_shortest_path(
            'path': None,
            'steps': 0}
 
-   data['path'] = find_path(grid, start, exit, False)
+   data['path'] = (path_finder or find_path)(grid, start, exit, False)
    data['steps'] = len(data['path'])
 
    return data
 
 
-def get_path(
+def get_next_move(
     congestion: bool,
     near_exit: bool,
     pedestrian: Pedestrian,
     exit: Position,
-    selected_static_field: Dict[str, Any],
+    selected_static_field: Any,
     cache: Any,
     grid: GridType
-) -> Path:
+) -> int:
     """
-    Get appropriate path based on congestion and proximity to exit.
+    Get the next move towards the exit based on congestion and proximity to exit.
 
     Args:
         congestion: Whether there is congestion
         near_exit: Whether pedestrian is near exit
         pedestrian: Pedestrian object
         exit: Exit position
-        selected_static_field: Dictionary containing static field information
+        selected_static_field: Static field entry of the pedestrian's position
         cache: Cache object for path storage
         grid: Environment matrix
 
     Returns:
-        List of positions representing the path
+        Code of the next move (see utils.move_offsets), no_move if there is none
     """
     if (congestion and not near_exit):
-        path = cache.cache_path(pedestrian, exit, grid)
+        move_code = cache.cache_path(pedestrian, exit, grid)
     else:
-        path = selected_static_field['path']
-
-    return path
+        move_code = selected_static_field['next_move']
 
+    return move_code
@@ -0,0 +1,32 @@
+from typing import Callable, Dict, List, Tuple, Any
+from .astar import find_path, find_path_jps
+from .hierarchical import find_path_hierarchical
+
+Position = Tuple[int, int]
+PathFinder = Callable[[Any, Position, Position, bool], List[Position]]
+
+# Pathfinding backends sharing the find_path(grid, start, goal, consider_congestion) signature
+path_finders: Dict[str, PathFinder] = {
+    'astar': find_path,
+    'jps': find_path_jps,
+    'hpa': find_path_hierarchical
+}
+
+
+def get_path_finder(name: str) -> PathFinder:
+    """
+    Get a pathfinding backend by name.
+
+    Args:
+        name: One of the keys of path_finders ('astar', 'jps', 'hpa')
+
+    Returns:
+        Function with the find_path signature
+
+    Raises:
+        ValueError: If the backend does not exist
+    """
+    if name not in path_finders:
+        raise ValueError(f"Unknown pathfinding backend '{name}', expected one of {sorted(path_finders)}")
+
+    return path_finders[name]
\ No newline at end of file
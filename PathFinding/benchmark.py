@@ -0,0 +1,108 @@
+"""
+Compare the nodes expanded and the wall time of A* and Jump Point Search.
+
+Run from the repository root with `python -m PathFinding.benchmark`.
+"""
+import random
+from time import perf_counter
+from typing import Dict, List, Tuple
+import numpy as np
+from Fields import FloorField
+from utils import exits
+from .grid_astar import GridAStar
+
+Position = Tuple[int, int]
+
+
+def get_queries(grid: FloorField, targets: List[Position], count: int, seed: int = 0) -> List[Tuple[Position, Position]]:
+    """
+    Draw random (start, target) pairs on the free cells of a grid.
+
+    Args:
+        grid: Environment grid
+        targets: Positions the queries lead to
+        count: Number of queries
+        seed: Seed of the random generator
+
+    Returns:
+        List of (start, target) positions
+    """
+    rng = random.Random(seed)
+    free = [tuple(cell) for cell in np.argwhere(grid.grid == 0).tolist()]
+
+    return [(rng.choice(free), rng.choice(targets)) for _ in range(count)]
+
+
+def run(engine: GridAStar, queries: List[Tuple[Position, Position]], method: str) -> Dict[str, float]:
+    """
+    Time a search method over a list of queries.
+
+    Args:
+        engine: Search engine of the grid
+        queries: List of (start, target) positions
+        method: 'find_path' or 'find_path_jps'
+
+    Returns:
+        Dictionary with the mean nodes expanded, the total time in ms and the total path cost
+    """
+    search = getattr(engine, method)
+    expanded = 0
+    cost = 0.0
+
+    start_time = perf_counter()
+    for start, goal in queries:
+        search(start, goal)
+        expanded += engine.expanded
+        cost += engine.last_cost
+    elapsed = perf_counter() - start_time
+
+    return {'expanded': expanded / len(queries), 'ms': 1000 * elapsed, 'cost': cost}
+
+
+def get_scenarios() -> Dict[str, Tuple[FloorField, List[Position]]]:
+    """
+    Build the benchmarked floors.
+
+    Returns:
+        Dictionary of name -> (grid, targets): the default open floor, the
+        floor with rooms, and larger open floors with scattered pillars
+    """
+    open_floor = FloorField(50, 50)
+    open_floor.add_exit(exits)
+
+    rooms = FloorField(50, 50)
+    rooms.add_exit(exits)
+    rooms.setup_rooms()
+
+    scenarios = {'open 50x50': (open_floor, list(exits)), 'rooms 50x50': (rooms, list(exits))}
+
+    for size in (100, 200):
+        grid = FloorField(size, size)
+        grid.grid[5::10, 5::10] = 3
+        grid.layout_version += 1
+        targets = [(size - 1, size // 2), (0, size // 2)]
+        scenarios[f'pillars {size}x{size}'] = (grid, targets)
+
+    return scenarios
+
+
+def main(count: int = 500) -> None:
+    """
+    Print the A* and Jump Point Search results of every scenario.
+
+    Args:
+        count: Number of queries per scenario
+    """
+    print(f"{'scenario':<16}{'backend':<8}{'expanded':>10}{'ms':>10}{'cost':>12}")
+
+    for name, (grid, targets) in get_scenarios().items():
+        engine = GridAStar.for_grid(grid)
+        queries = get_queries(grid, targets, count)
+
+        for backend, method in (('astar', 'find_path'), ('jps', 'find_path_jps')):
+            result = run(engine, queries, method)
+            print(f"{name:<16}{backend:<8}{result['expanded']:>10.1f}{result['ms']:>10.1f}{result['cost']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from typing import Dict, Tuple, Any, Optional
+from numpy.typing import NDArray
+from utils import get_congestion_settings
+from .distance_field import distance_fields
+from .grid_astar import occupied_counts, CONGESTION_COST
+
+Position = Tuple[int, int]
+
+
+class CongestionField:
+    """
+    Congestion-weighted next moves towards each exit, shared by all pedestrians.
+
+    Instead of one A* search per congested pedestrian, one reverse Dijkstra
+    per exit is run over the whole grid with the same costs as
+    find_path(..., consider_congestion=True). Every congested pedestrian
+    heading to that exit reads its next move from the result. Fields are
+    recomputed lazily once the occupancy or the layout of the grid changes.
+
+    Attributes:
+        radius (Optional[int]): Congestion radius used for the costs, None for the grid's
+        fields_radius (Optional[int]): Radius the fields were computed with
+        occupancy_version (Optional[int]): Occupancy the fields were computed for
+        layout_version (Optional[int]): Floor layout the fields were computed for
+        next_moves (Dict[Position, NDArray]): Next move codes per exit
+        searches (int): Number of Dijkstra runs so far
+    """
+
+    def __init__(self, radius: Optional[int] = None) -> None:
+        """
+        Initialize without any computed field.
+
+        Args:
+            radius: Congestion radius used for the costs, the grid's congestion radius if not given
+        """
+        self.radius = radius
+        self.fields_radius: Optional[int] = None
+        self.occupancy_version: Optional[int] = None
+        self.layout_version: Optional[int] = None
+        self.next_moves: Dict[Position, NDArray] = {}
+        self.searches = 0
+
+    def get_next_move(self, position: Position, exit: Position, grid: Any) -> int:
+        """
+        Get the congestion-aware next move from a position towards an exit.
+
+        Args:
+            position: Current position (y, x)
+            exit: Exit position (y, x)
+            grid: FloorField with the current occupancy
+
+        Returns:
+            Code of the next move (see utils.move_offsets), no_move if there is none
+        """
+        radius = get_congestion_settings(grid)[1] if self.radius is None else self.radius
+
+        if (grid.occupancy.version != self.occupancy_version or grid.layout_version != self.layout_version
+                or radius != self.fields_radius):
+            self.occupancy_version = grid.occupancy.version
+            self.layout_version = grid.layout_version
+            self.fields_radius = radius
+            self.next_moves.clear()
+
+        if exit not in self.next_moves:
+            penalty = occupied_counts(grid, radius) * CONGESTION_COST
+            _, next_moves, _ = distance_fields(grid, [exit], penalty)
+            self.next_moves[exit] = next_moves[0]
+            self.searches += 1
+
+        return int(self.next_moves[exit][position])
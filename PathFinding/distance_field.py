@@ -0,0 +1,282 @@
+from typing import List, Tuple, Any, Optional, Iterable
+import numpy as np
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from heapq import heappush, heappop
+from utils import directions, orthogonal_cost, diagonal_cost, no_move, move_offsets, get_move_code
+
+Position = Tuple[int, int]
+Edges = Tuple[NDArray, NDArray, NDArray]
+
+# Share of the grid above which a repair searches the whole field again instead
+FULL_SEARCH_FRACTION = 0.05
+
+
+def grid_edges(walls: NDArray) -> Edges:
+    """
+    Build the movement graph of a grid as flat edge arrays.
+
+    Args:
+        walls: Boolean matrix where True marks a wall cell
+
+    Returns:
+        Tuple containing:
+            - sources: Flat index of the cell the move starts from
+            - targets: Flat index of the cell the move ends on
+            - costs: Base movement cost of each edge (orthogonal/diagonal)
+
+    Note:
+        Mirrors the neighbourhood used by A*: 8 directions, walls are never
+        entered and diagonal moves are allowed next to wall corners.
+    """
+    height, width = walls.shape
+    indices = np.arange(height * width).reshape(height, width)
+    free = ~walls
+
+    sources, targets, costs = [], [], []
+    for dy, dx in directions:
+        # Cells (y, x) whose neighbour (y + dy, x + dx) lies inside the grid
+        src = (slice(max(0, -dy), height - max(0, dy)), slice(max(0, -dx), width - max(0, dx)))
+        dst = (slice(max(0, dy), height + min(0, dy)), slice(max(0, dx), width + min(0, dx)))
+
+        valid = free[src] & free[dst]
+        sources.append(indices[src][valid])
+        targets.append(indices[dst][valid])
+        costs.append(np.full(np.count_nonzero(valid), diagonal_cost if dx and dy else orthogonal_cost))
+
+    return np.concatenate(sources), np.concatenate(targets), np.concatenate(costs)
+
+
+def path_lengths(next_cells: NDArray) -> NDArray:
+    """
+    Count the cells on every path encoded by a next-cell table.
+
+    Args:
+        next_cells: Flat index of the next cell towards the target for every
+            cell, -1 for the target itself and for unreachable cells
+
+    Returns:
+        Number of cells in each path (start and target included), as the
+        'steps' value of find_shortest_path
+
+    Note:
+        Uses pointer jumping, so the cost is O(cells * log(path length)).
+    """
+    size = next_cells.shape[-1]
+    cells = np.arange(size)
+    has_next = next_cells >= 0
+
+    pointer = np.where(has_next, next_cells, cells)
+    hops = has_next.astype(np.int64)
+
+    while not np.array_equal(np.take_along_axis(pointer, pointer, axis=-1), pointer):
+        hops += np.take_along_axis(hops, pointer, axis=-1)
+        pointer = np.take_along_axis(pointer, pointer, axis=-1)
+    hops += np.take_along_axis(hops, pointer, axis=-1)
+
+    return (hops + 1).astype(float)
+
+
+def next_move_codes(next_cells: NDArray, width: int) -> NDArray:
+    """
+    Convert a next-cell table into compact move codes.
+
+    Args:
+        next_cells: Flat index of the next cell towards the target, -1 if none
+        width: Grid width used to flatten the indices
+
+    Returns:
+        int8 array with the code of the move leading to the next cell
+        (see utils.move_offsets), no_move where there is no next cell
+    """
+    cells = np.arange(next_cells.shape[-1])
+    dy = next_cells // width - cells // width
+    dx = next_cells % width - cells % width
+
+    return np.where(next_cells >= 0, (dy + 1) * 3 + (dx + 1), no_move).astype(np.int8)
+
+
+def distance_fields(
+    grid: Any,
+    targets: List[Position],
+    penalty: Optional[NDArray] = None
+) -> Tuple[NDArray, NDArray, NDArray]:
+    """
+    Flood fill the whole grid from each target with Dijkstra.
+
+    Args:
+        grid: Environment grid (FloorField or matrix)
+        targets: Exit or door positions (y, x) to compute fields for
+        penalty: Optional extra cost for entering each cell
+
+    Returns:
+        Tuple of arrays with shape (targets, height, width):
+            - distances: Movement cost from each cell to the target
+            - next_moves: int8 code of the next move towards the target,
+              no_move for the target itself and for unreachable cells
+            - steps: float32 number of cells in the path, as
+              find_shortest_path reports it (infinity if unreachable)
+
+    Note:
+        The search runs on the reversed movement graph, so a single run per
+        target gives the distance *to* the target from every cell.
+    """
+    cells = np.asarray(getattr(grid, 'grid', grid))
+    height, width = cells.shape
+    size = height * width
+
+    sources, ends, costs = grid_edges(cells == 3)
+    if penalty is not None:
+        costs = costs + penalty.ravel()[ends]
+
+    # Reversed graph: an edge end -> source carries the cost of moving source -> end
+    reversed_graph = csr_matrix((costs, (ends, sources)), shape=(size, size))
+    target_indices = [y * width + x for y, x in targets]
+
+    distances, predecessors = dijkstra(reversed_graph, indices=target_indices, return_predecessors=True)
+    distances = np.atleast_2d(distances)
+    next_cells = np.where(np.atleast_2d(predecessors) < 0, -1, np.atleast_2d(predecessors))
+
+    steps = path_lengths(next_cells)
+    steps[np.isinf(distances)] = np.inf
+
+    shape = (len(targets), height, width)
+    next_moves = next_move_codes(next_cells, width)
+    return distances.reshape(shape), next_moves.reshape(shape), steps.astype(np.float32).reshape(shape)
+
+
+def get_subtree(next_moves: NDArray, roots: List[int], width: int) -> NDArray:
+    """
+    Find the cells whose path to the target goes through any of the roots.
+
+    Args:
+        next_moves: Flat next move codes of one field, no_move where there is none
+        roots: Flat indices of the cells to start from
+        width: Grid width used to flatten the indices
+
+    Returns:
+        Boolean mask of the roots and of every cell leading into them
+    """
+    size = next_moves.size
+    cells = np.arange(size)
+    has_next = next_moves >= 0
+
+    # Tree of the field: row n lists the cells whose next move leads into n
+    offsets = move_offsets[:, 0] * width + move_offsets[:, 1]
+    parents = cells[has_next] + offsets[next_moves[has_next]]
+    tree = csr_matrix((np.ones(parents.size, dtype=bool), (parents, cells[has_next])), shape=(size, size))
+
+    subtree = np.zeros(size, dtype=bool)
+    frontier = np.unique(np.asarray(roots, dtype=np.int64))
+    subtree[frontier] = True
+
+    while frontier.size:
+        children = tree[frontier].indices
+        frontier = np.unique(children[~subtree[children]])
+        subtree[frontier] = True
+
+    return subtree
+
+
+def repair_distance_field(
+    walls: NDArray,
+    target: Position,
+    distances: NDArray,
+    next_moves: NDArray,
+    steps: NDArray,
+    blocked: Iterable[Position] = (),
+    unblocked: Iterable[Position] = ()
+) -> int:
+    """
+    Update one distance field in place after cells became walls or free.
+
+    Blocking a cell only lengthens the paths that went through it: those
+    cells are invalidated and searched again from the cells around them.
+    Freeing a cell can only shorten paths: distances are lowered outwards
+    from it until no cell improves. Cells that are not affected are never
+    touched, in the spirit of LPA* / D* Lite.
+
+    Args:
+        walls: Boolean matrix of the new layout where True marks a wall
+        target: Exit or door the field leads to
+        distances: Movement cost to the target, shape (height, width)
+        next_moves: int8 next move codes, shape (height, width)
+        steps: Number of cells in each path, shape (height, width)
+        blocked: Cells that became walls
+        unblocked: Cells that stopped being walls
+
+    Returns:
+        Number of cells that were searched again or got a shorter path
+
+    Note:
+        The field arrays must be C-contiguous and writable, as the layers of
+        StaticField are.
+    """
+    height, width = walls.shape
+    distance, moves, length = distances.reshape(-1), next_moves.reshape(-1), steps.reshape(-1)
+    is_wall = walls.ravel()
+    target_index = target[0] * width + target[1]
+
+    blocked = [y * width + x for y, x in blocked]
+    unblocked = [y * width + x for y, x in unblocked]
+
+    # Cells whose path went through a blocked cell must be searched again
+    region = get_subtree(moves, blocked, width) if blocked else np.zeros(is_wall.size, dtype=bool)
+    region[unblocked] = True
+    region_cells = np.flatnonzero(region)
+
+    # A large region is faster to search again with the compiled Dijkstra
+    if region_cells.size > FULL_SEARCH_FRACTION * is_wall.size:
+        field = distance_fields(np.where(walls, 3, 0), [target])
+        distances[:], next_moves[:], steps[:] = (layer[0] for layer in field)
+        if is_wall[target_index]:
+            distance[:], length[:], moves[:] = np.inf, np.inf, no_move
+        return int(region_cells.size)
+
+    distance[region_cells] = np.inf
+    length[region_cells] = np.inf
+    moves[region_cells] = no_move
+
+    open_set = []
+    if region[target_index] and not is_wall[target_index]:
+        distance[target_index], length[target_index] = 0, 1
+        open_set.append((0.0, target_index))
+
+    # Search again from the settled cells around the region
+    for cell in region_cells.tolist():
+        y, x = divmod(cell, width)
+        for dy, dx in directions:
+            neighbor_y, neighbor_x = y + dy, x + dx
+            if 0 <= neighbor_y < height and 0 <= neighbor_x < width:
+                neighbor = neighbor_y * width + neighbor_x
+                if not region[neighbor] and np.isfinite(distance[neighbor]):
+                    open_set.append((float(distance[neighbor]), neighbor))
+    open_set.sort()
+
+    changed = set(region_cells.tolist())
+    while open_set:
+        current_distance, current = heappop(open_set)
+        if current_distance > distance[current]:
+            continue
+
+        y, x = divmod(current, width)
+        for dy, dx in directions:
+            # Cell moving into current with the move (dy, dx)
+            neighbor_y, neighbor_x = y - dy, x - dx
+            if not (0 <= neighbor_y < height and 0 <= neighbor_x < width):
+                continue
+
+            neighbor = neighbor_y * width + neighbor_x
+            if is_wall[neighbor]:
+                continue
+
+            new_distance = current_distance + (diagonal_cost if dx and dy else orthogonal_cost)
+            if new_distance < distance[neighbor] - 1e-6 * new_distance:
+                distance[neighbor] = new_distance
+                moves[neighbor] = get_move_code((dy, dx))
+                length[neighbor] = length[current] + 1
+                changed.add(neighbor)
+                heappush(open_set, (float(distance[neighbor]), neighbor))
+
+    return len(changed)
@@ -0,0 +1,409 @@
+from typing import List, Tuple, Any, Optional
+from heapq import heappush, heappop
+from math import hypot
+import numpy as np
+from numpy.typing import NDArray
+from scipy.ndimage import convolve
+from utils import directions, orthogonal_cost, diagonal_cost, get_congestion_settings
+
+Position = Tuple[int, int]
+Path = List[Position]
+
+# Extra cost per occupied cell around a neighbour, as in get_movement_cost
+CONGESTION_COST = 0.7
+
+
+def occupied_counts(grid: Any, radius: Optional[int] = None) -> NDArray:
+    """
+    Count the pedestrians in the (2 * radius + 1)² window around every cell.
+
+    Args:
+        grid: FloorField or environment matrix
+        radius: Radius of the neighbourhood, the grid's congestion radius if not given
+
+    Returns:
+        Matrix with the number of occupied cells around each cell, the window
+        being clipped at the grid border. Read from the occupancy table (and
+        cached until pedestrians move) when the grid is a FloorField.
+    """
+    if radius is None:
+        _, radius = get_congestion_settings(grid)
+
+    occupancy = getattr(grid, 'occupancy', None)
+    if occupancy is not None:
+        counts = occupancy.window_counts(radius)
+    else:
+        window = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.int32)
+        counts = convolve((np.asarray(grid) == 1).astype(np.int32), window, mode='constant')
+
+    return counts
+
+
+class GridAStar:
+    """
+    A* search over flat cell indices with preallocated score arrays.
+
+    The neighbour table and the score arrays are built once per floor layout.
+    Scores are never reset between searches: a generation counter tells which
+    entries belong to the current search.
+
+    Attributes:
+        height (int): Number of rows of the grid
+        width (int): Number of columns of the grid
+        layout_version (int): FloorField layout the tables were built for
+        table (NDArray): int32 (cells, directions) flat index of the neighbour
+            in each direction, -1 for walls and cells outside the grid
+        costs (List[float]): Move cost of each direction of the table
+        free (NDArray): Free cells of the grid padded with a wall border, flattened
+        g_score (NDArray): Cost from the start of the current search
+        came_from (NDArray): Previous cell on the best known path
+        generation (NDArray): Search each g_score/came_from entry belongs to
+        expanded (int): Nodes expanded by the last search
+        last_cost (float): Cost of the path found by the last search (infinity if none)
+        jump_length (int): Moves covered by the last successful straight jump
+    """
+
+    def __init__(self, cells: NDArray, layout_version: int = 0) -> None:
+        """
+        Build the neighbour table and allocate the score arrays.
+
+        Args:
+            cells: Environment matrix
+            layout_version: Layout version of the FloorField the matrix belongs to
+        """
+        self.height, self.width = cells.shape
+        self.layout_version = layout_version
+        size = self.height * self.width
+
+        # Offset table: one column per direction, -1 where the move is not possible
+        free = np.pad(cells != 3, 1, constant_values=False)
+        indices = np.arange(size, dtype=np.int32).reshape(self.height, self.width)
+        self.table = np.full((size, len(directions)), -1, dtype=np.int32)
+
+        for column, (dy, dx) in enumerate(directions):
+            reachable = free[1 + dy:1 + dy + self.height, 1 + dx:1 + dx + self.width]
+            self.table[:, column] = np.where(reachable, indices + dy * self.width + dx, -1).ravel()
+
+        self.costs = [diagonal_cost if dx and dy else orthogonal_cost for dy, dx in directions]
+
+        # Free cells of the padded grid, flattened, for Jump Point Search. The
+        # memoryview indexes like a list without copying the array into Python objects
+        self.free = free.ravel()
+        self._free = memoryview(self.free)
+
+        self.g_score = np.zeros(size)
+        self.came_from = np.full(size, -1, dtype=np.int64)
+        self.generation = np.zeros(size, dtype=np.uint32)
+        self.current_generation = 0
+        self.expanded = 0
+        self.last_cost = float('inf')
+        self.jump_length = 0
+
+        # Congestion costs of the last congested search, as a list for fast access
+        self._occupied: Optional[NDArray] = None
+        self._penalty: List[float] = []
+
+    @classmethod
+    def for_grid(cls, grid: Any) -> 'GridAStar':
+        """
+        Get the engine of a grid, building it if the layout changed.
+
+        Args:
+            grid: FloorField or environment matrix
+
+        Returns:
+            Engine for the grid. It is kept on FloorField objects and
+            rebuilt only when their layout_version changes.
+        """
+        if not hasattr(grid, 'layout_version'):
+            return cls(np.asarray(grid))
+
+        if grid.astar is None or grid.astar.layout_version != grid.layout_version:
+            grid.astar = cls(grid.grid, grid.layout_version)
+
+        return grid.astar
+
+    def find_path(
+        self,
+        start: Position,
+        goal: Position,
+        occupied: Optional[NDArray] = None
+    ) -> Path:
+        """
+        Find a path with A*, same result as the tuple based implementation.
+
+        Args:
+            start: Starting position as (y, x)
+            goal: Goal position as (y, x)
+            occupied: Optional occupied_counts matrix. When given, entering a
+                cell costs CONGESTION_COST more per pedestrian around it
+
+        Returns:
+            List of positions representing the path from start to goal.
+            Empty list if no path is found.
+        """
+        width = self.width
+        start_index = start[0] * width + start[1]
+        goal_index = goal[0] * width + goal[1]
+        goal_y, goal_x = goal
+
+        penalty = None
+        if occupied is not None:
+            if occupied is not self._occupied:
+                self._occupied = occupied
+                self._penalty = (occupied * CONGESTION_COST).ravel().tolist()
+            penalty = self._penalty
+
+        # New search: entries from older generations count as unvisited
+        self.current_generation += 1
+        generation, current_generation = self.generation, self.current_generation
+        g_score, came_from = self.g_score, self.came_from
+
+        generation[start_index] = current_generation
+        g_score[start_index] = 0
+        came_from[start_index] = -1
+
+        open_set = [(0, start_index)]
+        self.expanded = 0
+        self.last_cost = float('inf')
+
+        table, costs, count = memoryview(self.table.ravel()), self.costs, len(self.costs)
+
+        while open_set:
+            f, current = heappop(open_set)
+
+            if current == goal_index:
+                self.last_cost = float(g_score[current])
+                path = []
+                while current != -1:
+                    path.append(divmod(current, width))
+                    current = int(came_from[current])
+                path.reverse()
+                return path
+
+            current_g = g_score[current]
+
+            # Skip heap entries left behind by a later improvement of the score
+            y, x = divmod(current, width)
+            if f > current_g + hypot(y - goal_y, x - goal_x):
+                continue
+
+            self.expanded += 1
+
+            for neighbor, cost in zip(table[current * count:(current + 1) * count], costs):
+                if neighbor < 0:
+                    continue
+                if penalty is not None:
+                    cost += penalty[neighbor]
+
+                tentative_g_score = current_g + cost
+
+                if generation[neighbor] != current_generation or tentative_g_score < g_score[neighbor]:
+                    generation[neighbor] = current_generation
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+
+                    y, x = divmod(neighbor, width)
+                    heappush(open_set, (tentative_g_score + hypot(y - goal_y, x - goal_x), neighbor))
+
+        return []
+
+    def is_free(self, y: int, x: int) -> bool:
+        """Whether (y, x) is inside the grid and not a wall."""
+        return self._free[(y + 1) * (self.width + 2) + x + 1]
+
+    def jump(self, y: int, x: int, dy: int, dx: int, goal: Position) -> Optional[Position]:
+        """
+        Move from (y, x) in direction (dy, dx) until reaching a jump point.
+
+        Args:
+            y: Row of the cell the jump starts from
+            x: Column of the cell the jump starts from
+            dy: Row direction (-1, 0 or 1)
+            dx: Column direction (-1, 0 or 1)
+            goal: Goal position as (y, x)
+
+        Returns:
+            First cell in that direction that is the goal or has a forced
+            neighbour, None if a wall or the grid border is reached first
+        """
+        # Work on padded flat indices: the wall border stops every scan
+        row = self.width + 2
+        free = self._free
+        index = (y + 1) * row + x + 1
+        goal_index = (goal[0] + 1) * row + goal[1] + 1
+        step = dy * row + dx
+
+        if dy and dx:
+            while True:
+                index += step
+                if not free[index]:
+                    return None
+                if index == goal_index:
+                    break
+                if ((not free[index - dx] and free[index + dy * row - dx])
+                        or (not free[index - dy * row] and free[index - dy * row + dx])):
+                    break
+                if (self.jump_straight(index, dy * row, dx, goal_index)
+                        or self.jump_straight(index, dx, row, goal_index)):
+                    break
+        elif self.jump_straight(index, step, row if dx else 1, goal_index):
+            index += step * self.jump_length
+        else:
+            return None
+
+        return divmod(index, row)[0] - 1, index % row - 1
+
+    def jump_straight(self, index: int, step: int, side: int, goal_index: int) -> bool:
+        """
+        Scan a straight line of the padded grid for a jump point.
+
+        Args:
+            index: Padded flat index the scan starts from
+            step: Index offset of one move along the line
+            side: Index offset to the cells on either side of the line
+            goal_index: Padded flat index of the goal
+
+        Returns:
+            Whether a jump point was found. Its distance, in moves, is
+            left in jump_length.
+        """
+        free = self._free
+        start = index
+
+        while True:
+            index += step
+            if not free[index]:
+                return False
+            if (index == goal_index
+                    or (not free[index + side] and free[index + side + step])
+                    or (not free[index - side] and free[index - side + step])):
+                self.jump_length = (index - start) // step
+                return True
+
+    def get_jump_directions(self, y: int, x: int, parent: int) -> List[Tuple[int, int]]:
+        """
+        Get the pruned search directions of a jump point.
+
+        Args:
+            y: Row of the jump point
+            x: Column of the jump point
+            parent: Flat index of the previous jump point, -1 for the start
+
+        Returns:
+            Natural and forced directions (dy, dx) to jump to
+        """
+        if parent < 0:
+            return directions
+
+        parent_y, parent_x = divmod(parent, self.width)
+        dy = (y > parent_y) - (y < parent_y)
+        dx = (x > parent_x) - (x < parent_x)
+        is_free = self.is_free
+
+        if dy and dx:
+            jumps = [(dy, 0), (0, dx), (dy, dx)]
+            if not is_free(y, x - dx):
+                jumps.append((dy, -dx))
+            if not is_free(y - dy, x):
+                jumps.append((-dy, dx))
+        elif dx:
+            jumps = [(0, dx)]
+            if not is_free(y + 1, x):
+                jumps.append((1, dx))
+            if not is_free(y - 1, x):
+                jumps.append((-1, dx))
+        else:
+            jumps = [(dy, 0)]
+            if not is_free(y, x + 1):
+                jumps.append((dy, 1))
+            if not is_free(y, x - 1):
+                jumps.append((dy, -1))
+
+        return jumps
+
+    def find_path_jps(self, start: Position, goal: Position) -> Path:
+        """
+        Find a path with Jump Point Search on the uniform cost grid.
+
+        Only jump points are pushed to the open set: straight and diagonal
+        runs without forced neighbours are skipped, which prunes the many
+        symmetric paths an open floor has. The result has the same format as
+        find_path, with every cell of the path listed.
+
+        Args:
+            start: Starting position as (y, x)
+            goal: Goal position as (y, x)
+
+        Returns:
+            List of positions representing the path from start to goal.
+            Empty list if no path is found.
+        """
+        width = self.width
+        # Python ints: the direction signs below are computed from comparisons
+        start, goal = (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
+        start_index = start[0] * width + start[1]
+        goal_index = goal[0] * width + goal[1]
+        goal_y, goal_x = goal
+
+        def octile(y: int, x: int) -> float:
+            dy, dx = abs(y - goal_y), abs(x - goal_x)
+            return diagonal_cost * min(dy, dx) + orthogonal_cost * abs(dy - dx)
+
+        self.current_generation += 1
+        generation, current_generation = self.generation, self.current_generation
+        g_score, came_from = self.g_score, self.came_from
+
+        generation[start_index] = current_generation
+        g_score[start_index] = 0
+        came_from[start_index] = -1
+
+        open_set = [(octile(*start), start_index)]
+        self.expanded = 0
+        self.last_cost = float('inf')
+
+        while open_set:
+            f, current = heappop(open_set)
+            y, x = divmod(current, width)
+            current_g = g_score[current]
+
+            if f > current_g + octile(y, x):
+                continue
+
+            if current == goal_index:
+                self.last_cost = float(current_g)
+                jump_points = []
+                while current != -1:
+                    jump_points.append(divmod(current, width))
+                    current = int(came_from[current])
+                jump_points.reverse()
+
+                # Fill in the cells between consecutive jump points
+                path = [jump_points[0]]
+                for end_y, end_x in jump_points[1:]:
+                    cell_y, cell_x = path[-1]
+                    dy = (end_y > cell_y) - (end_y < cell_y)
+                    dx = (end_x > cell_x) - (end_x < cell_x)
+                    while (cell_y, cell_x) != (end_y, end_x):
+                        cell_y, cell_x = cell_y + dy, cell_x + dx
+                        path.append((cell_y, cell_x))
+                return path
+
+            self.expanded += 1
+
+            for dy, dx in self.get_jump_directions(y, x, int(came_from[current])):
+                jump_point = self.jump(y, x, dy, dx, goal)
+                if jump_point is None:
+                    continue
+
+                distance = max(abs(jump_point[0] - y), abs(jump_point[1] - x))
+                tentative_g_score = current_g + distance * (diagonal_cost if dy and dx else orthogonal_cost)
+                neighbor = jump_point[0] * width + jump_point[1]
+
+                if generation[neighbor] != current_generation or tentative_g_score < g_score[neighbor]:
+                    generation[neighbor] = current_generation
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tentative_g_score
+                    heappush(open_set, (tentative_g_score + octile(*jump_point), neighbor))
+
+        return []
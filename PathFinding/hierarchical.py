@@ -0,0 +1,449 @@
+from typing import Dict, List, Tuple, Set, Any, Optional
+from heapq import heappush, heappop
+import numpy as np
+from numpy.typing import NDArray
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from utils import directions, orthogonal_cost, diagonal_cost
+from .distance_field import grid_edges
+from .grid_astar import occupied_counts, CONGESTION_COST
+
+Position = Tuple[int, int]
+Path = List[Position]
+
+# Entrances longer than this get a portal at each end instead of one in the middle
+LONG_ENTRANCE = 6
+
+# (dy, dx, cost) of every move
+MOVES = [(dy, dx, diagonal_cost if dy and dx else orthogonal_cost) for dy, dx in directions]
+
+
+class Cluster:
+    """
+    Square block of the grid with its local movement graph.
+
+    Attributes:
+        y0 (int): First row of the block
+        x0 (int): First column of the block
+        height (int): Number of rows of the block
+        width (int): Number of columns of the block
+        sources (NDArray): Local index where each edge starts
+        ends (NDArray): Local index where each edge ends
+        costs (NDArray): Base cost of each edge
+        portals (List[int]): Global flat indices of the portal cells in the block
+        distances (NDArray): Distance from each portal to each local cell
+    """
+
+    def __init__(self, walls: NDArray, y0: int, x0: int) -> None:
+        """
+        Build the local graph of a block.
+
+        Args:
+            walls: Boolean wall matrix of the block
+            y0: First row of the block in the grid
+            x0: First column of the block in the grid
+        """
+        self.y0, self.x0 = y0, x0
+        self.height, self.width = walls.shape
+        self.sources, self.ends, self.costs = grid_edges(walls)
+        self.portals: List[int] = []
+        self.distances: Optional[NDArray] = None
+
+    def local(self, position: Position) -> int:
+        """Local index of a grid position inside the block."""
+        return (position[0] - self.y0) * self.width + (position[1] - self.x0)
+
+    def search(self, sources: List[int], penalty: Optional[NDArray] = None) -> NDArray:
+        """
+        Run Dijkstra inside the block.
+
+        Args:
+            sources: Local indices to search from
+            penalty: Optional extra cost of entering each local cell
+
+        Returns:
+            Distances, shape (sources, cells)
+        """
+        costs = self.costs if penalty is None else self.costs + penalty.ravel()[self.ends]
+        size = self.height * self.width
+        graph = csr_matrix((costs, (self.sources, self.ends)), shape=(size, size))
+
+        return np.atleast_2d(dijkstra(graph, indices=sources))
+
+
+class HierarchicalPlanner:
+    """
+    HPA* style planner over square clusters of the grid.
+
+    The grid is split into clusters; free cells facing each other across a
+    cluster border form entrances, and each entrance gets one or two portal
+    pairs. Diagonal moves across a border between two walls, such as through
+    the corner shared by four clusters, get a portal pair of their own, so
+    the abstract graph connects every pair of cells the grid connects.
+    Distances between the portals of a cluster are precomputed once per floor
+    plan, so a query only runs two small local searches (to connect start and
+    goal to their clusters' portals) and a search on the small abstract portal
+    graph. The path is then refined with A* restricted to the clusters the
+    abstract path crosses, which straightens the detours through portals.
+
+    Clusters are square tiles rather than the rooms of setup_rooms: rooms
+    only cover part of a floor plan and the space around them would make one
+    cluster as large as the grid, while tiles bound the cost of every local
+    search. Room doors still end up as the only portals of their walls.
+
+    Attributes:
+        cluster_size (int): Side of the clusters in cells
+        layout_version (int): FloorField layout the graph was built for
+        clusters (Dict[Tuple[int, int], Cluster]): Clusters by (row, column)
+        edges (Dict[int, List[Tuple[int, float]]]): Abstract graph between portals
+        free (List[bool]): Free cells of the grid padded with a wall border, flattened
+        expanded (int): Abstract nodes and grid cells expanded by the last query
+    """
+
+    def __init__(self, cells: NDArray, cluster_size: int = 16, layout_version: int = 0) -> None:
+        """
+        Build clusters, portals and the abstract graph.
+
+        Args:
+            cells: Environment matrix
+            cluster_size: Side of the clusters in cells
+            layout_version: Layout version of the FloorField the matrix belongs to
+        """
+        self.cluster_size = cluster_size
+        self.layout_version = layout_version
+        self.height, self.width = cells.shape
+        walls = cells == 3
+        self.free: List[bool] = np.pad(~walls, 1, constant_values=False).ravel().tolist()
+
+        self.clusters: Dict[Tuple[int, int], Cluster] = {}
+        for y0 in range(0, self.height, cluster_size):
+            for x0 in range(0, self.width, cluster_size):
+                block = walls[y0:y0 + cluster_size, x0:x0 + cluster_size]
+                self.clusters[(y0 // cluster_size, x0 // cluster_size)] = Cluster(block, y0, x0)
+
+        self.edges: Dict[int, List[Tuple[int, float]]] = {}
+        self.add_entrances(walls)
+
+        # Portal to portal distances inside each cluster
+        for cluster in self.clusters.values():
+            if not cluster.portals:
+                continue
+
+            local_portals = [cluster.local(divmod(portal, self.width)) for portal in cluster.portals]
+            cluster.distances = cluster.search(local_portals)
+
+            for row, portal in enumerate(cluster.portals):
+                for other, local_other in zip(cluster.portals, local_portals):
+                    cost = cluster.distances[row, local_other]
+                    if other != portal and np.isfinite(cost):
+                        self.edges.setdefault(portal, []).append((other, float(cost)))
+
+        self.expanded = 0
+
+        # Congestion costs of the last congested query, as a list for fast access
+        self._occupied: Optional[NDArray] = None
+        self._penalty: List[float] = []
+
+    @classmethod
+    def for_grid(cls, grid: Any) -> 'HierarchicalPlanner':
+        """
+        Get the planner of a grid, building it if the layout changed.
+
+        Args:
+            grid: FloorField or environment matrix
+
+        Returns:
+            Planner for the grid, kept on FloorField objects until their
+            layout_version changes
+        """
+        if not hasattr(grid, 'layout_version'):
+            return cls(np.asarray(grid))
+
+        if grid.hierarchy is None or grid.hierarchy.layout_version != grid.layout_version:
+            grid.hierarchy = cls(grid.grid, layout_version=grid.layout_version)
+
+        return grid.hierarchy
+
+    def get_cluster(self, position: Position) -> Cluster:
+        """Cluster containing a grid position."""
+        return self.clusters[(position[0] // self.cluster_size, position[1] // self.cluster_size)]
+
+    def add_portal(self, inside: Position, outside: Position, cost: float = orthogonal_cost) -> None:
+        """
+        Add a pair of portal cells facing each other across a cluster border.
+
+        Args:
+            inside: Portal cell in the first cluster
+            outside: Portal cell in the neighbouring cluster
+            cost: Cost of the move between them
+        """
+        for cell, other in ((inside, outside), (outside, inside)):
+            index = cell[0] * self.width + cell[1]
+            cluster = self.get_cluster(cell)
+
+            if index not in cluster.portals:
+                cluster.portals.append(index)
+            self.edges.setdefault(index, []).append((other[0] * self.width + other[1], cost))
+
+    def add_entrances(self, walls: NDArray) -> None:
+        """
+        Find the entrances between neighbouring clusters and add their portals.
+
+        Args:
+            walls: Boolean wall matrix of the grid
+        """
+        size = self.cluster_size
+
+        # Vertical borders (between columns x - 1 and x) then horizontal ones
+        borders = [(x, True) for x in range(size, self.width, size)] + \
+                  [(y, False) for y in range(size, self.height, size)]
+
+        for line, vertical in borders:
+            length = self.height if vertical else self.width
+
+            for start in range(0, length, size):
+                segment: List[int] = []
+
+                for offset in range(start, min(start + size, length)):
+                    a = (offset, line - 1) if vertical else (line - 1, offset)
+                    b = (offset, line) if vertical else (line, offset)
+
+                    if not walls[a] and not walls[b]:
+                        segment.append(offset)
+                        if offset + 1 < min(start + size, length):
+                            continue
+
+                    if segment:
+                        picks = [segment[0], segment[-1]] if len(segment) >= LONG_ENTRANCE else [segment[len(segment) // 2]]
+                        for pick in picks:
+                            if vertical:
+                                self.add_portal((pick, line - 1), (pick, line))
+                            else:
+                                self.add_portal((line - 1, pick), (line, pick))
+                        segment = []
+
+        self.add_diagonal_entrances(walls)
+
+    def add_diagonal_entrances(self, walls: NDArray) -> None:
+        """
+        Add portals for the diagonal border crossings no entrance covers.
+
+        A diagonal move from a to b crossing a cluster border is only missing
+        from the abstract graph when both cells it cuts between are walls:
+        otherwise a free one lies on an entrance next to a or b and is
+        reached through the same cluster.
+
+        Args:
+            walls: Boolean wall matrix of the grid
+        """
+        size = self.cluster_size
+        free = ~walls
+
+        # Moves from (y, x) to (y + 1, x + dx), cutting between (y, x + dx) and (y + 1, x)
+        for dx in (1, -1):
+            here, there = (slice(None, -1), slice(1, None)) if dx == 1 else (slice(1, None), slice(None, -1))
+            found = free[:-1, here] & free[1:, there] & walls[:-1, there] & walls[1:, here]
+
+            ys, xs = np.nonzero(found)
+            xs = xs + (here.start or 0)
+            crossing = (ys // size != (ys + 1) // size) | (xs // size != (xs + dx) // size)
+
+            for y, x in zip(ys[crossing].tolist(), xs[crossing].tolist()):
+                self.add_portal((y, x), (y + 1, x + dx), diagonal_cost)
+
+    def find_path(self, start: Position, goal: Position, occupied: Optional[NDArray] = None) -> Path:
+        """
+        Find a path through the abstract graph and refine it locally.
+
+        Args:
+            start: Starting position as (y, x)
+            goal: Goal position as (y, x)
+            occupied: Optional occupied_counts matrix. Congestion costs are
+                applied when connecting the start to its cluster's portals
+                and in the refinement
+
+        Returns:
+            List of positions from start to goal, empty if no path is found
+
+        Note:
+            Falls back to A* over the whole grid if the abstract search finds
+            no path, so a goal is never missed.
+        """
+        start, goal = (int(start[0]), int(start[1])), (int(goal[0]), int(goal[1]))
+        start_index = start[0] * self.width + start[1]
+        goal_index = goal[0] * self.width + goal[1]
+
+        start_cluster, goal_cluster = self.get_cluster(start), self.get_cluster(goal)
+
+        block_penalty, penalty = None, None
+        if occupied is not None:
+            if occupied is not self._occupied:
+                self._occupied = occupied
+                self._penalty = (occupied * CONGESTION_COST).ravel().tolist()
+            penalty = self._penalty
+
+            block = occupied[start_cluster.y0:start_cluster.y0 + start_cluster.height,
+                             start_cluster.x0:start_cluster.x0 + start_cluster.width]
+            block_penalty = block * CONGESTION_COST
+
+        start_distances = start_cluster.search([start_cluster.local(start)], block_penalty)[0]
+        goal_distances = goal_cluster.search([goal_cluster.local(goal)])[0]
+
+        # Temporary abstract edges for the start and the goal, unreachable portals left out
+        start_edges = [(portal, float(start_distances[start_cluster.local(divmod(portal, self.width))]))
+                       for portal in start_cluster.portals]
+        if start_cluster is goal_cluster:
+            start_edges.append((goal_index, float(start_distances[start_cluster.local(goal)])))
+        start_edges = [(node, cost) for node, cost in start_edges if cost < np.inf]
+        goal_edges = {portal: float(goal_distances[goal_cluster.local(divmod(portal, self.width))])
+                      for portal in goal_cluster.portals}
+        goal_edges = {portal: cost for portal, cost in goal_edges.items() if cost < np.inf}
+
+        # A* on the abstract graph
+        width, goal_y, goal_x = self.width, goal[0], goal[1]
+
+        def heuristic(node: int) -> float:
+            # Octile distance, exact on an empty grid
+            dy, dx = divmod(node, width)
+            dy, dx = abs(dy - goal_y), abs(dx - goal_x)
+            return orthogonal_cost * abs(dy - dx) + diagonal_cost * min(dy, dx)
+
+        best = {start_index: 0.0}
+        came_from: Dict[int, int] = {}
+        open_set = [(heuristic(start_index), start_index)]
+        self.expanded = 0
+
+        while open_set:
+            f, node = heappop(open_set)
+            if node == goal_index:
+                break
+
+            cost = best[node]
+            if f > cost + heuristic(node):
+                continue
+            self.expanded += 1
+
+            neighbors = self.edges.get(node, [])
+            if node == start_index:
+                neighbors = neighbors + start_edges
+            if node in goal_edges:
+                neighbors = neighbors + [(goal_index, goal_edges[node])]
+
+            for neighbor, edge_cost in neighbors:
+                new_cost = cost + edge_cost
+                if new_cost < best.get(neighbor, np.inf):
+                    best[neighbor] = new_cost
+                    came_from[neighbor] = node
+                    heappush(open_set, (new_cost + heuristic(neighbor), neighbor))
+
+        if goal_index not in best:
+            return self.refine(start, goal, None, penalty)
+
+        # Clusters crossed by the abstract path: the portals and the start
+        corridor = {(start[0] // self.cluster_size, start[1] // self.cluster_size)}
+        node = goal_index
+        while node != start_index:
+            y, x = divmod(node, self.width)
+            corridor.add((y // self.cluster_size, x // self.cluster_size))
+            node = came_from[node]
+
+        return self.refine(start, goal, corridor, penalty)
+
+    def refine(
+        self,
+        start: Position,
+        goal: Position,
+        corridor: Optional[Set[Tuple[int, int]]],
+        penalty: Optional[List[float]] = None
+    ) -> Path:
+        """
+        Find the grid path with A* restricted to some clusters.
+
+        Args:
+            start: Starting position as (y, x)
+            goal: Goal position as (y, x)
+            corridor: (row, column) of the clusters the path may cross, None for the whole grid
+            penalty: Optional extra cost of entering each cell, flattened
+
+        Returns:
+            Cheapest path from start to goal inside the corridor, empty if there is none
+        """
+        width, size, free = self.width, self.cluster_size, self.free
+        padded_width = width + 2
+        start_index = start[0] * width + start[1]
+        goal_index = goal[0] * width + goal[1]
+        goal_y, goal_x = goal
+
+        def heuristic(y: int, x: int) -> float:
+            # Octile distance, exact on an empty grid
+            dy, dx = abs(y - goal_y), abs(x - goal_x)
+            return orthogonal_cost * abs(dy - dx) + diagonal_cost * min(dy, dx)
+
+        best = {start_index: 0.0}
+        came_from = {start_index: -1}
+        open_set = [(heuristic(*start), start_index)]
+
+        while open_set:
+            f, current = heappop(open_set)
+
+            if current == goal_index:
+                path = []
+                while current != -1:
+                    path.append(divmod(current, width))
+                    current = came_from[current]
+                path.reverse()
+                return path
+
+            current_g = best[current]
+            y, x = divmod(current, width)
+
+            # Skip heap entries left behind by a later improvement of the score
+            if f > current_g + heuristic(y, x):
+                continue
+
+            self.expanded += 1
+
+            for dy, dx, cost in MOVES:
+                ny, nx = y + dy, x + dx
+                if not free[(ny + 1) * padded_width + nx + 1]:
+                    continue
+                if corridor is not None and (ny // size, nx // size) not in corridor:
+                    continue
+
+                neighbor = ny * width + nx
+                tentative_g_score = current_g + cost
+                if penalty is not None:
+                    tentative_g_score += penalty[neighbor]
+
+                if tentative_g_score < best.get(neighbor, np.inf):
+                    best[neighbor] = tentative_g_score
+                    came_from[neighbor] = current
+                    heappush(open_set, (tentative_g_score + heuristic(ny, nx), neighbor))
+
+        return []
+
+
+def find_path_hierarchical(
+    grid: Any,
+    start: Position,
+    goal: Position,
+    consider_congestion: bool
+) -> Path:
+    """
+    Find a path with the hierarchical (HPA*) planner.
+
+    Args:
+        grid: FloorField or environment matrix
+        start: Starting position as (y, x)
+        goal: Goal position as (y, x)
+        consider_congestion: Whether to add congestion costs (around the start in the
+            abstract search, along the whole refined path)
+
+    Returns:
+        List of positions representing the path from start to goal.
+        Empty list if no path is found.
+    """
+    planner = HierarchicalPlanner.for_grid(grid)
+    occupied = occupied_counts(grid) if consider_congestion else None
+
+    return planner.find_path(start, goal, occupied)
@@ -1,6 +1,6 @@
 import numpy as np
-import random
-from utils import directions
+from utils import directions, move_offsets, no_move, get_move_code
+from Matrix import gather_neighborhoods
 from typing import Optional, Tuple, List, Any, Union
 from numpy.typing import NDArray
 
@@ -19,6 +19,9 @@ class Pedestrian:
             prefered_next_position (tuple): Next preferred position based on chosen movement.
             chosen_exit (tuple): Coordinates of the chosen exit destination (y, x).
         """
+    __slots__ = ('id', 'position', 'best_move', 'prefered_move', 'prefered_next_position',
+                 'prob_prefered_next_position', 'chosen_exit')
+
     def __init__(self) -> None:
         """Initialize a new pedestrian with default values."""
         self.id: int = 0
@@ -123,15 +126,16 @@ class Pedestrian:
         """
         possible_moves = np.zeros((3, 3), dtype=object)
         cell_position = list(self.position)
+        neighborhood = gather_neighborhoods(np.asarray(getattr(grid, 'grid', grid))[:height, :width], [cell_position], fill=3)[0]
 
         for line in moves:
             for move in line:
-                new_pos =  tuple(a + b for a, b in zip(cell_position, move))
                 pos_x = center_x + move[0]
                 pos_y = center_y + move[1]
+                cell = neighborhood[1 + move[0], 1 + move[1]]
 
-                # Verifica se o movimento é válido (dentro do grid e não é parede) posso remover ultima verificação
-                if ((0 <= new_pos[0] < height and 0 <= new_pos[1] < width and grid[new_pos[0], new_pos[1]] != 3 and grid[new_pos[0], new_pos[1]] != 1)):
+                # Verifica se o movimento é válido (dentro do grid e não é parede nem pedestre)
+                if cell != 3 and cell != 1:
                     possible_moves[pos_x, pos_y] = move
 
                 else:
@@ -139,68 +143,104 @@ class Pedestrian:
 
         return possible_moves
 
-    def get_best_move(self, path: List[Tuple[int, int]]) -> None:
+    def get_best_move(self, move_code: int) -> None:
         """
-        Determine the best move based on the provided path.
+        Determine the best move based on the next move towards the goal.
 
         Args:
-            path (list): List of positions representing the path to the goal.
+            move_code (int): Code of the next move on the path to the goal
+                (see utils.move_offsets). The best move is kept when it is no_move.
         """
-        if len(path) > 1:
-            p1 = self.position
-            p2 = path[1]
-
-            self.best_move = tuple(b - a for a, b in zip(p1, p2))
+        if move_code != no_move:
+            self.best_move = tuple(int(d) for d in move_offsets[move_code])
 
-    def chose_next_move(self,
-            rotated_preference_matrix: NDArray,
-            moves: List[List[Optional[Tuple[int, int]]]]
-    ) -> List[Optional[Tuple[int, int]]]:
-        """
-        Choose next move based on a preference matrix.
 
-        Args:
-            rotated_preference_matrix (numpy.ndarray): Rotated preference matrix.
-            moves (list): List of possible moves.
+def _column_property(column: str, doc: str) -> property:
+    """Property reading and writing one column of the group at the view's row."""
+    def getter(view: 'PedestrianView') -> Any:
+        return getattr(view.group, column)[view.index].item()
 
-        Returns:
-            tuple: Chosen move based on preference matrix probabilities.
-        """
-        moves_ = []
-        for line in moves:
-            for move in line:
-                moves_.append(move)
+    def setter(view: 'PedestrianView', value: Any) -> None:
+        getattr(view.group, column)[view.index] = value
 
-        probs = np.array(rotated_preference_matrix).flatten()
-        self.prefered_move = random.choices(moves_, probs)[0]
+    return property(getter, setter, doc=doc)
 
-        next_move_index = moves_.index(self.prefered_move)
-        self.prob_prefered_next_position = probs[next_move_index]
 
-    def get_move(
-        self,
-        matrix: NDArray,
-        possible_moves: NDArray
-    ) -> None:
-        """
-        Get a valid move based on the preference matrix.
+class PedestrianView(Pedestrian):
+    """
+        Pedestrian whose state lives in one row of a columnar Pedestrians group.
 
-        Args:
-            matrix (numpy.ndarray): Preference matrix.
-            possible_moves (numpy.ndarray): Matrix of possible moves.
+        Reads and writes go straight to the group's arrays, so all Pedestrian
+        methods keep working. A view is only valid until the group removes
+        pedestrians, which moves rows around.
 
-        Note:
-            Keeps trying until a valid (non-None) move is found.
+        Attributes:
+            group (Pedestrians): Group holding the arrays
+            index (int): Row of the pedestrian in the arrays
         """
-        move_null = True
-        while move_null:
-            # Return next move based on the preference matrix
-            self.chose_next_move(matrix, possible_moves)
+    __slots__ = ('group', 'index')
 
-            if self.prefered_move != None:
-                move_null = False
+    def __init__(self, group: Any, index: int) -> None:
+        """
+        Initialize a view on a row of a group.
 
+        Args:
+            group (Pedestrians): Group holding the arrays.
+            index (int): Row of the pedestrian.
+        """
+        self.group = group
+        self.index = index
+
+    id = _column_property('ids', 'Unique identifier for the pedestrian.')
+    prob_prefered_next_position = _column_property('probabilities', 'Probability of the preferred move.')
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """Current position in the grid (y, x)."""
+        return int(self.group.y[self.index]), int(self.group.x[self.index])
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        self.group.y[self.index], self.group.x[self.index] = position
+
+    @property
+    def best_move(self) -> Optional[Tuple[int, int]]:
+        """Best movement calculated based on static_field, None if not set."""
+        return self.group.get_move(self.group.best_moves[self.index])
+
+    @best_move.setter
+    def best_move(self, move: Optional[Tuple[int, int]]) -> None:
+        self.group.best_moves[self.index] = no_move if move is None else get_move_code(move)
+
+    @property
+    def prefered_move(self) -> Optional[Tuple[int, int]]:
+        """Calculated preferred movement for the next step, None if not set."""
+        return self.group.get_move(self.group.prefered_moves[self.index])
+
+    @prefered_move.setter
+    def prefered_move(self, move: Optional[Tuple[int, int]]) -> None:
+        self.group.prefered_moves[self.index] = no_move if move is None else get_move_code(move)
+
+    @property
+    def prefered_next_position(self) -> Optional[Tuple[int, int]]:
+        """Next preferred position, derived from the position and the preferred move."""
+        move = self.prefered_move
+        if move is None:
+            return None
 
+        y, x = self.position
+        return y + move[0], x + move[1]
 
+    @prefered_next_position.setter
+    def prefered_next_position(self, position: Tuple[int, int]) -> None:
+        y, x = self.position
+        self.prefered_move = (position[0] - y, position[1] - x)
 
+    @property
+    def chosen_exit(self) -> Optional[Tuple[int, int]]:
+        """Coordinates of the chosen exit destination (y, x), None if not chosen."""
+        return self.group.get_target(self.group.chosen_exits[self.index])
 
+    @chosen_exit.setter
+    def chosen_exit(self, exit: Optional[Tuple[int, int]]) -> None:
+        self.group.chosen_exits[self.index] = self.group.get_target_index(exit)
@@ -1,8 +1,10 @@
-import random
-from .pedestrian import Pedestrian
-from collections import Counter
-from typing import List, Tuple, Any
+import numpy as np
+from .pedestrian import Pedestrian, PedestrianView
+from typing import Dict, List, Tuple, Any, Optional, Iterator
 from numpy.typing import NDArray
+from utils import move_offsets, no_move
+
+Position = Tuple[int, int]
 
 
 class Pedestrians:
@@ -13,141 +15,340 @@ class Pedestrians:
        when multiple pedestrians want to move to the same position, and updating their
        positions on the grid.
 
+       Pedestrians are stored column-wise in contiguous arrays, the first
+       `count` rows being the pedestrians still in the simulation. Evacuated
+       pedestrians are swap-removed. PedestrianView objects give the
+       per-pedestrian API on top of the arrays.
+
        Attributes:
-           info (List[Pedestrian]): List of pedestrian objects.
-           positions (List[Tuple[int, int]]): Current positions of all pedestrians.
-           prefered_next_positions (List[Tuple[int, int]]): Desired next positions
-               of all pedestrians.
+           count (int): Number of pedestrians in the simulation.
+           ids (NDArray): int32 identifier of each pedestrian.
+           y (NDArray): int32 row of each pedestrian.
+           x (NDArray): int32 column of each pedestrian.
+           chosen_exits (NDArray): int16 index in targets of the chosen exit, -1 if none.
+           best_moves (NDArray): int8 code of the best move (see utils.move_offsets), no_move if none.
+           prefered_moves (NDArray): int8 code of the preferred move, no_move if none.
+           probabilities (NDArray): float32 probability of the preferred move.
+           alive (NDArray): Whether each row holds a pedestrian still in the simulation.
+           targets (List[Position]): Exits and doors referenced by chosen_exits.
+           evacuated_ids (NDArray): Identifiers of the pedestrians evacuated in the last update.
+           evacuated_positions (NDArray): (M, 2) exits they left through.
        """
-    def __init__(self):
-        """Initialize an empty pedestrians collection."""
-        self.info: List[Pedestrian] = []
-        self.positions: List[Tuple[int, int]] = []
-        self.prefered_next_positions: List[Tuple[int, int]] = []
-        self.probs_prefered_next_positions: List[int] = []
+    def __init__(self, capacity: int = 0):
+        """
+        Initialize an empty pedestrians collection.
+
+        Args:
+            capacity: Number of rows allocated up front, grown as needed
+        """
+        self.count = 0
+        self.ids = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.chosen_exits = np.full(capacity, -1, dtype=np.int16)
+        self.best_moves = np.full(capacity, no_move, dtype=np.int8)
+        self.prefered_moves = np.full(capacity, no_move, dtype=np.int8)
+        self.probabilities = np.zeros(capacity, dtype=np.float32)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        self.targets: List[Position] = []
+        self.target_indices: Dict[Position, int] = {}
+
+        self.evacuated_ids = np.zeros(0, dtype=np.int32)
+        self.evacuated_positions = np.zeros((0, 2), dtype=np.int32)
+
+    columns = ('ids', 'y', 'x', 'chosen_exits', 'best_moves', 'prefered_moves', 'probabilities', 'alive')
+
+    def __len__(self) -> int:
+        """Number of pedestrians in the simulation."""
+        return self.count
+
+    def __getitem__(self, index: int) -> PedestrianView:
+        """
+        Get the view of a pedestrian.
+
+        Args:
+            index: Row of the pedestrian
+
+        Returns:
+            View reading and writing the pedestrian's row
+        """
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+
+        return PedestrianView(self, index)
+
+    def __iter__(self) -> Iterator[PedestrianView]:
+        """Iterate over views of the pedestrians in the simulation."""
+        return (PedestrianView(self, index) for index in range(self.count))
+
+    @property
+    def info(self) -> List[PedestrianView]:
+        """Views of the pedestrians in the simulation, in row order."""
+        return list(self)
+
+    @info.setter
+    def info(self, pedestrians: List[Pedestrian]) -> None:
+        if all(isinstance(p, PedestrianView) and p.group is self for p in pedestrians):
+            # Views of this group, e.g. a filtered self.info: keep their rows, in the given order
+            rows = [p.index for p in pedestrians]
+            if rows == list(range(self.count)):
+                return
+
+            for column in self.columns:
+                array = getattr(self, column)
+                array[:len(rows)] = array[rows]
+            self.alive[len(rows):self.count] = False
+            self.count = len(rows)
+            return
+
+        self.count = 0
+        for pedestrian in pedestrians:
+            self.add(pedestrian.position, pedestrian.id)
+            view = self[self.count - 1]
+            view.best_move, view.prefered_move = pedestrian.best_move, pedestrian.prefered_move
+            view.chosen_exit = pedestrian.chosen_exit
+            if pedestrian.prob_prefered_next_position is not None:
+                view.prob_prefered_next_position = pedestrian.prob_prefered_next_position
+
+    @property
+    def positions(self) -> NDArray:
+        """(count, 2) array of the current (y, x) positions."""
+        return np.stack((self.y[:self.count], self.x[:self.count]), axis=1)
+
+    @property
+    def prefered_next_positions(self) -> NDArray:
+        """(count, 2) array of the preferred next positions (current one if no move is set)."""
+        moves = self.prefered_moves[:self.count]
+        offsets = np.where((moves >= 0)[:, None], move_offsets[moves], 0)
+        return self.positions + offsets
+
+    @property
+    def probs_prefered_next_positions(self) -> NDArray:
+        """Probabilities of the preferred moves."""
+        return self.probabilities[:self.count]
+
+    def get_move(self, code: int) -> Optional[Position]:
+        """
+        Convert a move code into a move.
+
+        Args:
+            code: Move code, no_move for none
 
-    @staticmethod
-    def normalize_move_probs(probs: List[float]) -> List[float]:
+        Returns:
+            (dy, dx) move, None for no_move
         """
-        Normalize a list of probabilities of movement so they sum to 1.
+        if code == no_move:
+            return None
+
+        dy, dx = move_offsets[code]
+        return int(dy), int(dx)
+
+    def get_target(self, index: int) -> Optional[Position]:
+        """
+        Get the exit or door of a chosen_exits index.
 
         Args:
-            probs: List of probability values to normalize
+            index: Index in targets, -1 for none
 
         Returns:
-            List of normalized probabilities that sum to 1
+            Position of the target, None for -1
+        """
+        return None if index < 0 else self.targets[index]
 
-        Raises:
-            ValueError: If any probability is negative
-            TypeError: If input contains non-numeric values
+    def get_target_index(self, target: Optional[Position]) -> int:
+        """
+        Get the chosen_exits index of an exit or door, registering it if needed.
 
-        Example:
-            >>> normalize_move_probs([2, 3, 5])
-            [0.2, 0.3, 0.5]
+        Args:
+            target: Exit or door position, None for none
+
+        Returns:
+            Index in targets, -1 for None
         """
-        probs_ = []
-        sum_probs = sum(probs)
-        for prob_ in probs:
-            prob_movement = prob_/sum_probs
-            probs_.append(prob_movement)
-        return probs_
+        if target is None:
+            return -1
+
+        target = (int(target[0]), int(target[1]))
+        if target not in self.target_indices:
+            self.target_indices[target] = len(self.targets)
+            self.targets.append(target)
 
+        return self.target_indices[target]
 
-    def solve_conflicts(self) -> None:
+    def needs_exit(self, exits: List[Position]) -> NDArray:
+        """
+        Get which pedestrians have not chosen one of the given exits.
+
+        Args:
+            exits: List of open exit positions
+
+        Returns:
+            (count,) boolean array, True where the chosen exit is none, a door
+            or an exit that is not open
+        """
+        indices = [self.target_indices[tuple(exit)] for exit in exits if tuple(exit) in self.target_indices]
+
+        return ~np.isin(self.chosen_exits[:self.count], indices)
+
+    def set_chosen_exits(self, rows: NDArray, exits: List[Optional[Position]]) -> None:
+        """
+        Set the chosen exit of many pedestrians.
+
+        Args:
+            rows: Rows of the pedestrians
+            exits: Chosen exit of each of them, None to keep the current one
+        """
+        for row, exit in zip(rows, exits):
+            if exit is not None:
+                self.chosen_exits[row] = self.get_target_index(exit)
+
+    def add(self, position: Position, id: Optional[int] = None) -> PedestrianView:
+        """
+        Add a pedestrian.
+
+        Args:
+            position: Position (y, x) of the pedestrian
+            id: Identifier, the row number if not given
+
+        Returns:
+            View of the new pedestrian
+        """
+        if self.count == len(self.y):
+            capacity = max(16, 2 * self.count)
+            for column in self.columns:
+                array = getattr(self, column)
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:self.count] = array[:self.count]
+                setattr(self, column, grown)
+
+        index = self.count
+        self.count += 1
+
+        self.ids[index] = index if id is None else id
+        self.y[index], self.x[index] = position
+        self.chosen_exits[index] = -1
+        self.best_moves[index] = self.prefered_moves[index] = no_move
+        self.probabilities[index] = 0
+        self.alive[index] = True
+
+        return PedestrianView(self, index)
+
+    def remove_evacuated(self) -> None:
+        """
+        Drop the pedestrians whose alive flag was cleared.
+
+        Each removed row is filled with the last row still in the
+        simulation (swap-remove), so the arrays stay compact.
+        """
+        index = 0
+        while index < self.count:
+            if self.alive[index]:
+                index += 1
+                continue
+
+            last = self.count - 1
+            for column in self.columns:
+                array = getattr(self, column)
+                array[index] = array[last]
+            self.alive[last] = False
+            self.count -= 1
+
+    def solve_conflicts(self, rng: Optional[np.random.Generator] = None) -> None:
         """
         Resolve conflicts when multiple pedestrians want to move to the same position.
 
         This method implements a conflict resolution strategy where, when multiple
         pedestrians want to move to the same position, one is randomly chosen to
         move while others stay in their current positions.
-        """
-        conflict = True
-        while conflict:
-            # Update current positions and preferred next positions
-            self.positions = [pedestrian.position for pedestrian in self.info]
-            self.prefered_next_positions = [pedestrian.prefered_next_position for pedestrian in self.info]
-            self.probs_prefered_next_positions = [pedestrian.prob_prefered_next_position for pedestrian in self.info]
-
-            counter = Counter(self.prefered_next_positions)
-
-            # Check if there are any conflicts (same position desired by multiple pedestrians)
-            if sum(counter.values()) != len(set(self.prefered_next_positions)):
-                # Get positions with conflicts (more than one pedestrian wants to move there)
-                conflicts = [item for item, count in counter.items() if count > 1]
 
-                # Map conflicting positions to indices of pedestrians wanting to move there
-                conflicts_index = {position: [idx for idx, pos in enumerate(self.prefered_next_positions) if pos == position]
-                                   for position in conflicts}  # indices
+        Args:
+            rng: Random generator for the draws, a new one if not given
+
+        Note:
+            The winner of each cell is drawn with probability proportional to
+            the move probability of each contender (A. Schadschneider), by an
+            exponential race: every contender draws Exp(1) / probability and
+            the smallest draw wins. Target cells are grouped by sorting, so a
+            pass costs O(N log N). A pedestrian staying in place always keeps
+            its cell, so losers never lose twice and the loop stops after at
+            most N passes.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        count = self.count
+        if not count:
+            return
 
-                probs_of_each_move = {position: [prob for idx, prob in enumerate(self.probs_prefered_next_positions) if idx in conflicts_index[position]]
-                          for position in conflicts_index}
+        stay = 4  # Move code of staying in place
+        probabilities = np.maximum(self.probabilities[:count].astype(np.float64), np.finfo(np.float64).tiny)
 
-                # Normalized probs according to A Schadschneider principle
-                probs_ = {position: self.normalize_move_probs(probs_of_each_move[position])
-                            for position in conflicts_index}
+        while True:
+            targets = self.prefered_next_positions
+            cells = targets[:, 0].astype(np.int64) * (int(targets[:, 1].max()) + 2) + targets[:, 1]
 
-                # Randomly select one pedestrian for each conflicting position
-                random_pedestrian = {
-                    position: [random.choices(value, probs_[key])[0] for key, value in conflicts_index.items() if key == position]
-                    for position in conflicts_index}  # w
+            keys = rng.exponential(size=count) / probabilities
+            keys[np.isin(self.prefered_moves[:count], (stay, no_move))] = -1
 
-                # Resolve conflicts by making non-selected pedestrians stay in place
-                for key in conflicts_index:
-                    conflicts_index[key].remove(random_pedestrian[key][0])
-                    for conflict_index in conflicts_index[key]:
-                        self.info[conflict_index].prefered_next_position = self.info[conflict_index].position
+            # Sort by target cell, then by race key: the first of each cell wins
+            order = np.lexsort((keys, cells))
+            sorted_cells = cells[order]
+            losers = order[1:][sorted_cells[1:] == sorted_cells[:-1]]
 
-                self.prefered_next_positions = [pedestrian.prefered_next_position for pedestrian in self.info]
-            else:
-                conflict = False
+            if not losers.size:
+                break
 
+            # Non-selected pedestrians stay in place
+            self.prefered_moves[losers] = stay
 
     #Função deve ser definida para a classe grid e não pedestre
     def update_pedestrians_info(
         self,
         dynamic_field: Any,  # Type Any used as DynamicField class isn't imported
         exits: List[Tuple[int, int]],
-        grid: NDArray
-    ) -> Tuple[NDArray, Any]:
+        grid: Any
+    ) -> Tuple[Any, Any]:
         """
         Update pedestrians' positions, the grid and dynamic field state.
 
         Args:
             dynamic_field: Dynamic field object that influences pedestrians flow.
             exits: List of exit positions on the grid.
-            grid: Current state of the simulation grid.
+            grid: FloorField with the current state of the simulation grid.
 
         Returns:
             Tuple containing:
                 - Updated grid
                 - Updated dynamic field
         """
+        count = self.count
+        positions = self.positions
+        next_positions = self.prefered_next_positions
+
         # Clear old positions on grid
-        grid[tuple(zip(*[p.position for p in self.info]))] = 0
+        grid[positions[:, 0], positions[:, 1]] = 0
 
         # Get positions that need dynamic field update
-        positions_update_dynamic_field = [pedestrian.position for pedestrian in self.info
-                                          if pedestrian.position != pedestrian.prefered_next_position]
-
-        dynamic_field.update_dynamic_field(positions_update_dynamic_field)
-
-        # Remove pedestrians who reached exits
-        self.info = [p for p in self.info if p.prefered_next_position not in exits]
+        moved = (next_positions != positions).any(axis=1)
+        dynamic_field.update_dynamic_field(positions[moved])
 
         # Update positions
-        for p in self.info:
-            p.position = p.prefered_next_position
+        self.y[:count], self.x[:count] = next_positions[:, 0], next_positions[:, 1]
 
-        # If no pedestrians left return
-        if not self.info:
-            return grid, dynamic_field
+        # Remove pedestrians who reached exits
+        self.evacuated_ids = np.zeros(0, dtype=np.int32)
+        self.evacuated_positions = np.zeros((0, 2), dtype=np.int32)
+        if len(exits):
+            exit_cells = np.asarray(exits).reshape(-1, 2)
+            evacuated = ((next_positions[:, None, :] == exit_cells[None, :, :]).all(axis=2)).any(axis=1)
+            self.evacuated_ids = self.ids[:count][evacuated]
+            self.evacuated_positions = next_positions[evacuated].astype(np.int32)
+            self.alive[:count] &= ~evacuated
+            self.remove_evacuated()
 
         # Update grid with new positions
-        new_positions = [p.position for p in self.info]
-        grid[tuple(zip(*new_positions))] = 1
-
-        return grid, dynamic_field
-
-
+        grid[self.y[:self.count], self.x[:self.count]] = 1
 
+        # Keep congestion queries in sync with the new positions
+        grid.update_occupancy()
 
+        return grid, dynamic_field
@@ -0,0 +1,6 @@
+from .chunked_array import ChunkedArray
+from .recorder import TrajectoryFrames, TrajectoryRecorder
+from .trajectory_file import TrajectoryWriter, TrajectoryReader, TrajectorySegment
+
+__all__ = ['ChunkedArray', 'TrajectoryFrames', 'TrajectoryRecorder', 'TrajectoryWriter', 'TrajectoryReader',
+           'TrajectorySegment']
@@ -0,0 +1,100 @@
+from typing import List, Tuple, Union
+import numpy as np
+from numpy.typing import NDArray, ArrayLike, DTypeLike
+
+
+class ChunkedArray:
+    """
+    Append-only array stored in fixed-size chunks.
+
+    Appending never copies the data already stored: once a chunk is full a
+    new one is allocated, so memory grows by one chunk at a time instead of
+    doubling a single buffer.
+
+    Attributes:
+        dtype (np.dtype): Type of the elements
+        shape (Tuple[int, ...]): Shape of each row
+        chunk_size (int): Number of rows per chunk
+        chunks (List[NDArray]): Allocated chunks, the last one partially filled
+        size (int): Number of rows appended
+    """
+
+    def __init__(self, dtype: DTypeLike, shape: Tuple[int, ...] = (), chunk_size: int = 4096) -> None:
+        """
+        Initialize an empty array.
+
+        Args:
+            dtype: Type of the elements
+            shape: Shape of each row
+            chunk_size: Number of rows per chunk
+        """
+        self.dtype = np.dtype(dtype)
+        self.shape = tuple(shape)
+        self.chunk_size = chunk_size
+        self.chunks: List[NDArray] = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        """Number of rows appended."""
+        return self.size
+
+    def append(self, values: ArrayLike) -> None:
+        """
+        Append rows at the end.
+
+        Args:
+            values: Rows to append, shaped (N,) + shape or a single row
+        """
+        values = np.asarray(values, dtype=self.dtype).reshape((-1,) + self.shape)
+        written = 0
+
+        while written < len(values):
+            offset = self.size % self.chunk_size
+            if offset == 0:
+                self.chunks.append(np.empty((self.chunk_size,) + self.shape, dtype=self.dtype))
+
+            count = min(len(values) - written, self.chunk_size - offset)
+            self.chunks[-1][offset:offset + count] = values[written:written + count]
+            written += count
+            self.size += count
+
+    def __getitem__(self, index: Union[int, slice]) -> NDArray:
+        """
+        Read one row or a contiguous range of rows.
+
+        Args:
+            index: Row index or slice with step 1
+
+        Returns:
+            The row, or a new array with the rows of the slice
+        """
+        if not isinstance(index, slice):
+            index = index + self.size if index < 0 else index
+            if not 0 <= index < self.size:
+                raise IndexError(index)
+            return self.chunks[index // self.chunk_size][index % self.chunk_size]
+
+        start, stop, step = index.indices(self.size)
+        if step != 1:
+            raise ValueError("ChunkedArray slices must have step 1")
+
+        parts = []
+        while start < stop:
+            chunk, offset = divmod(start, self.chunk_size)
+            count = min(stop - start, self.chunk_size - offset)
+            parts.append(self.chunks[chunk][offset:offset + count])
+            start += count
+
+        if not parts:
+            return np.empty((0,) + self.shape, dtype=self.dtype)
+
+        return np.concatenate(parts)
+
+    def to_array(self) -> NDArray:
+        """
+        Copy every row into one contiguous array.
+
+        Returns:
+            (size,) + shape array
+        """
+        return self[:]
@@ -0,0 +1,350 @@
+from bisect import bisect_right
+from typing import List, Tuple, Any, Optional, Iterator
+import numpy as np
+from numpy.typing import NDArray
+from .chunked_array import ChunkedArray
+
+Position = Tuple[int, int]
+
+
+class TrajectoryFrames:
+    """
+    Rebuilds the frames of a trajectory recording.
+
+    Base of TrajectoryRecorder and of the segments read back from disk, which
+    hold the same buffers as chunked arrays or memory-mapped arrays. Any frame
+    is rebuilt from the last keyframe before it by replaying the moves and
+    exit events recorded since.
+
+    Attributes:
+        steps (Sequence[int]): Simulation step of each recorded frame
+        move_offsets: Start of each frame's moves in moved_ids and moves
+        moved_ids: int32 ids of the pedestrians who moved
+        moves: int8 (dy, dx) move of each of them
+        event_offsets: Start of each frame's events in the event buffers
+        event_steps: int32 step of each exit event
+        event_ids: int32 id of each evacuated pedestrian
+        event_exits: int16 index in exits of the exit used
+        exits (List[Position]): Exits that appear in the events
+        keyframes (List[Tuple[NDArray, NDArray]]): (ids, positions) snapshots
+        keyframe_frames (List[int]): Frame of each keyframe
+        layouts (List[NDArray]): uint8 layouts (walls and exits)
+        layout_frames (List[int]): Frame from which each layout applies
+        frames: uint8 full frames, None unless recorded in full-frame mode
+        id_count (int): One more than the largest pedestrian id
+    """
+
+    def __len__(self) -> int:
+        """Number of recorded frames."""
+        return len(self.steps)
+
+    def __getitem__(self, index: int) -> NDArray:
+        """
+        Get a recorded frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            uint8 grid of the frame
+        """
+        return self.get_frame(index)
+
+    def __iter__(self) -> Iterator[NDArray]:
+        """Iterate over the recorded frames."""
+        return (self.get_frame(index) for index in range(len(self)))
+
+    def get_positions(self, index: int) -> Tuple[NDArray, NDArray]:
+        """
+        Rebuild the positions of the pedestrians in a recorded frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            Tuple containing:
+                - (N,) ids of the pedestrians inside, in increasing order
+                - (N, 2) their positions (y, x)
+        """
+        index = index + len(self) if index < 0 else index
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        # Last keyframe at or before the frame
+        keyframe = bisect_right(self.keyframe_frames, index) - 1
+        start = self.keyframe_frames[keyframe]
+        ids, positions = self.keyframes[keyframe]
+
+        size = self.id_count
+        all_positions = np.zeros((size, 2), dtype=np.int32)
+        alive = np.zeros(size, dtype=bool)
+        all_positions[ids] = positions
+        alive[ids] = True
+
+        # Replay the moves and exits of the following frames
+        if index > start:
+            move_start, move_stop = self.get_offsets(self.move_offsets, len(self.moved_ids), start + 1, index)
+            np.add.at(all_positions, self.moved_ids[move_start:move_stop], self.moves[move_start:move_stop])
+
+            event_start, event_stop = self.get_offsets(self.event_offsets, len(self.event_ids), start + 1, index)
+            alive[self.event_ids[event_start:event_stop]] = False
+
+        ids = np.flatnonzero(alive)
+
+        return ids, all_positions[ids]
+
+    def get_offsets(self, offsets: Any, total: int, first: int, last: int) -> Tuple[int, int]:
+        """
+        Get the range of buffer rows recorded from one frame to another.
+
+        Args:
+            offsets: Start of each frame's rows
+            total: Number of rows in the buffer
+            first: First frame of the range
+            last: Last frame of the range, included
+
+        Returns:
+            (start, stop) rows
+        """
+        stop = int(offsets[last + 1]) if last + 1 < len(offsets) else total
+
+        return int(offsets[first]), stop
+
+    def get_frame(self, index: int) -> NDArray:
+        """
+        Get the grid of a recorded frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            uint8 grid with the same cell values as FloorField.grid
+        """
+        index = index + len(self) if index < 0 else index
+        if self.frames is not None:
+            return self.frames[index].copy()
+
+        ids, positions = self.get_positions(index)
+
+        return self.render(ids, positions, index)
+
+    def render(self, ids: NDArray, positions: NDArray, index: int) -> NDArray:
+        """
+        Draw pedestrians on the layout of a frame.
+
+        Args:
+            ids: Ids of the pedestrians
+            positions: (N, 2) their positions (y, x)
+            index: Index of the frame, used to pick the layout
+
+        Returns:
+            uint8 grid with the same cell values as FloorField.grid
+        """
+        frame = self.layouts[bisect_right(self.layout_frames, index) - 1].copy()
+        frame[positions[:, 0], positions[:, 1]] = 1
+
+        return frame
+
+    def get_exit_events(self) -> Tuple[NDArray, NDArray, NDArray]:
+        """
+        Get every exit event recorded.
+
+        Returns:
+            Tuple containing:
+                - (M,) step of each event
+                - (M,) id of the evacuated pedestrian
+                - (M, 2) exit position (y, x) used
+        """
+        exits = np.array(self.exits, dtype=np.int32).reshape(-1, 2)
+
+        return self.event_steps[:], self.event_ids[:], exits[self.event_exits[:]]
+
+
+class TrajectoryRecorder(TrajectoryFrames):
+    """
+    Records the pedestrians' trajectories of a simulation and rebuilds its frames.
+
+    Instead of one full grid copy per step, only what changes is kept in
+    chunked append-only buffers:
+
+    - the ids and one-cell moves of the pedestrians who moved in each step,
+    - the exit events (step, id and exit of each evacuated pedestrian),
+    - every keyframe_interval steps, the positions of everyone still inside,
+    - a uint8 copy of the floor layout (walls and exits) whenever it changes.
+
+    Any frame is rebuilt on demand from the last keyframe before it.
+    In full-frame mode, meant for small grids, a uint8 copy of every frame is
+    also stored, so frames are read back without replaying any move.
+
+    The recorder is a sequence of frames: recorder[i] is the grid after the
+    i-th recorded step, so it can be passed to animation.create_animation.
+    Its buffers (see TrajectoryFrames) are ChunkedArray objects.
+
+    Attributes:
+        grid (Any): FloorField of the recorded simulation
+        keyframe_interval (int): Number of steps between keyframes
+        full_frames (bool): Whether every frame is stored in full
+        position_dtype (np.dtype): int16, or int32 for grids larger than int16 coordinates
+        positions (NDArray): Position of every id as of the last recorded frame
+        alive (NDArray): Whether every id was inside as of the last recorded frame
+    """
+
+    def __init__(
+            self,
+            grid: Any,
+            keyframe_interval: int = 64,
+            chunk_size: int = 4096,
+            full_frames: bool = False
+    ) -> None:
+        """
+        Initialize an empty recording.
+
+        Args:
+            grid: FloorField of the simulation to record
+            keyframe_interval: Number of steps between keyframes
+            chunk_size: Number of rows per buffer chunk
+            full_frames: Whether to store every frame in full (small grids only)
+        """
+        self.grid = grid
+        self.keyframe_interval = keyframe_interval
+        self.full_frames = full_frames
+        self.position_dtype = np.dtype(np.int16 if max(grid.grid.shape) <= np.iinfo(np.int16).max else np.int32)
+
+        self.steps: List[int] = []
+        self.move_offsets = ChunkedArray(np.int64, chunk_size=chunk_size)
+        self.moved_ids = ChunkedArray(np.int32, chunk_size=chunk_size)
+        self.moves = ChunkedArray(np.int8, (2,), chunk_size=chunk_size)
+        self.event_offsets = ChunkedArray(np.int64, chunk_size=chunk_size)
+        self.event_steps = ChunkedArray(np.int32, chunk_size=chunk_size)
+        self.event_ids = ChunkedArray(np.int32, chunk_size=chunk_size)
+        self.event_exits = ChunkedArray(np.int16, chunk_size=chunk_size)
+        self.exits: List[Position] = []
+
+        self.keyframes: List[Tuple[NDArray, NDArray]] = []
+        self.keyframe_frames: List[int] = []
+        self.layouts: List[NDArray] = []
+        self.layout_frames: List[int] = []
+        self.layout_version: Optional[int] = None
+
+        height, width = grid.grid.shape
+        frames_per_chunk = max(1, chunk_size * 64 // (height * width))
+        self.frames = ChunkedArray(np.uint8, (height, width), frames_per_chunk) if full_frames else None
+
+        # Positions of every id as of the last recorded frame
+        self.positions = np.zeros((0, 2), dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.id_count = 0
+
+    def get_layout(self) -> NDArray:
+        """
+        Get the current floor layout, without the pedestrians.
+
+        Returns:
+            uint8 grid of the walls and exits
+        """
+        layout = self.grid.grid.astype(np.uint8)
+        layout[layout == 1] = 0
+
+        return layout
+
+    def record(self, state: Any) -> None:
+        """
+        Record the state of the simulation after a step.
+
+        Args:
+            state: StepState of the simulation. The first recorded state,
+                usually Simulation.get_state() before running, is a keyframe.
+        """
+        frame = len(self.steps)
+        ids = np.asarray(state.ids, dtype=np.int64)
+        positions = np.asarray(state.positions, dtype=np.int32).reshape(-1, 2)
+        evacuated_ids = np.asarray(state.evacuated_ids, dtype=np.int64)
+
+        # Grow the per-id arrays to the largest id seen
+        size = int(max(ids.max(initial=-1), evacuated_ids.max(initial=-1))) + 1
+        if size > len(self.alive):
+            self.positions = np.concatenate([self.positions, np.zeros((size - len(self.alive), 2), dtype=np.int32)])
+            self.alive = np.concatenate([self.alive, np.zeros(size - len(self.alive), dtype=bool)])
+            self.id_count = size
+
+        if self.grid.layout_version != self.layout_version:
+            self.layouts.append(self.get_layout())
+            self.layout_frames.append(frame)
+            self.layout_version = self.grid.layout_version
+
+        # Exit events
+        self.event_offsets.append(len(self.event_ids))
+        if len(evacuated_ids):
+            self.event_steps.append(np.full(len(evacuated_ids), state.step))
+            self.event_ids.append(evacuated_ids)
+            self.event_exits.append([self.get_exit_index(exit) for exit in map(tuple, state.evacuated_positions)])
+            self.alive[evacuated_ids] = False
+
+        # Moves of the pedestrians who were already inside
+        self.move_offsets.append(len(self.moved_ids))
+        known = self.alive[ids]
+        deltas = positions - self.positions[ids]
+        moved = known & (deltas != 0).any(axis=1)
+        self.moved_ids.append(ids[moved])
+        self.moves.append(deltas[moved])
+
+        self.positions[ids] = positions
+        self.alive[ids] = True
+        self.steps.append(int(state.step))
+
+        # Keyframes, also needed when pedestrians were added or moved more than one cell
+        if frame % self.keyframe_interval == 0 or not known.all() or (np.abs(deltas[moved]) > 1).any():
+            self.keyframes.append((ids.astype(np.int32), positions.astype(self.position_dtype)))
+            self.keyframe_frames.append(frame)
+
+        if self.frames is not None:
+            self.frames.append(self.render(ids, positions, frame))
+
+    def record_run(self, simulation: Any, max_steps: Optional[int] = None) -> 'TrajectoryRecorder':
+        """
+        Record the current state of a simulation, then every step while it runs.
+
+        Args:
+            simulation: Simulation to run
+            max_steps: Maximum number of steps to run, None to run until everyone evacuated
+
+        Returns:
+            The recorder itself
+        """
+        self.record(simulation.get_state())
+        for state in simulation.iter_steps(max_steps):
+            self.record(state)
+
+        return self
+
+    def get_exit_index(self, exit: Position) -> int:
+        """
+        Get the index of an exit in the events, registering it if needed.
+
+        Args:
+            exit: Exit position (y, x)
+
+        Returns:
+            Index of the exit in exits
+        """
+        exit = (int(exit[0]), int(exit[1]))
+        if exit not in self.exits:
+            self.exits.append(exit)
+
+        return self.exits.index(exit)
+
+    def nbytes(self) -> int:
+        """
+        Memory used by the recorded data.
+
+        Returns:
+            Number of bytes of the buffers, keyframes and layouts
+        """
+        buffers = [self.move_offsets, self.moved_ids, self.moves, self.event_offsets,
+                   self.event_steps, self.event_ids, self.event_exits]
+        if self.frames is not None:
+            buffers.append(self.frames)
+
+        return (sum(chunk.nbytes for buffer in buffers for chunk in buffer.chunks)
+                + sum(ids.nbytes + positions.nbytes for ids, positions in self.keyframes)
+                + sum(layout.nbytes for layout in self.layouts))
@@ -0,0 +1,400 @@
+import json
+import os
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Optional, Iterator
+import numpy as np
+from numpy.typing import NDArray
+from .recorder import TrajectoryFrames, TrajectoryRecorder
+
+# Bump when the stored arrays change meaning, so old files are not misread
+FORMAT_VERSION = 1
+
+INDEX_NAME = 'index.json'
+
+# Buffers stored as one .npy file each per segment
+BUFFERS = ('steps', 'move_offsets', 'moved_ids', 'moves', 'event_offsets', 'event_steps', 'event_ids', 'event_exits')
+
+
+def save_array(path: str, array: Any) -> None:
+    """
+    Write an array to a .npy file through a temporary name.
+
+    Args:
+        path: Path of the file
+        array: Array to write
+    """
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.save(file, np.ascontiguousarray(array))
+    os.replace(temporary_path, path)
+
+
+class TrajectorySegment(TrajectoryFrames):
+    """
+    Frames of one segment of a trajectory file, memory-mapped read-only.
+
+    Each segment starts with a keyframe, so its frames are rebuilt without
+    reading any other segment.
+    """
+
+    def __init__(self, directory: str, meta: Dict[str, Any]) -> None:
+        """
+        Memory-map the arrays of a segment.
+
+        Args:
+            directory: Folder holding the segment's .npy files
+            meta: Entry of the segment in the index
+        """
+        def load(name: str) -> NDArray:
+            return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+        for name in BUFFERS:
+            setattr(self, name, load(name))
+
+        self.exits = [tuple(exit) for exit in meta['exits']]
+        self.id_count = meta['id_count']
+
+        keyframe_offsets = load('keyframe_offsets')
+        keyframe_ids, keyframe_positions = load('keyframe_ids'), load('keyframe_positions')
+        self.keyframes = [(keyframe_ids[start:stop], keyframe_positions[start:stop])
+                          for start, stop in zip(keyframe_offsets[:-1], keyframe_offsets[1:])]
+        self.keyframe_frames = load('keyframe_frames').tolist()
+
+        self.layouts = list(load('layouts'))
+        self.layout_frames = load('layout_frames').tolist()
+
+        self.frames = load('frames') if meta['full_frames'] else None
+
+
+class TrajectoryWriter:
+    """
+    Streams the trajectories of a simulation to disk while it runs.
+
+    Frames are recorded by a TrajectoryRecorder and written every
+    segment_frames frames as a folder of .npy files, after which the
+    recorder is dropped, so memory stays bounded however long the run.
+    A JSON index lists the segments and the first frame of each one. It is
+    rewritten after every segment, so a TrajectoryReader can follow a run
+    still in progress.
+
+    Layout of the folder:
+        index.json
+        segment-000000/steps.npy, moves.npy, ...
+        segment-000001/...
+
+    Attributes:
+        path (str): Folder of the trajectory file
+        grid (Any): FloorField of the recorded simulation
+        segment_frames (int): Number of frames per segment
+        keyframe_interval (int): Number of steps between keyframes
+        chunk_size (int): Number of rows per buffer chunk
+        full_frames (bool): Whether every frame is also stored in full
+        segments (List[Dict[str, Any]]): Index entries of the written segments
+        frame_count (int): Number of frames written
+        recorder (Optional[TrajectoryRecorder]): Frames of the segment being recorded
+    """
+
+    def __init__(
+            self,
+            path: str,
+            grid: Any,
+            segment_frames: int = 1024,
+            keyframe_interval: int = 64,
+            chunk_size: int = 4096,
+            full_frames: bool = False
+    ) -> None:
+        """
+        Initialize an empty trajectory file.
+
+        Args:
+            path: Folder of the trajectory file, created if missing
+            grid: FloorField of the simulation to record
+            segment_frames: Number of frames per segment
+            keyframe_interval: Number of steps between keyframes
+            chunk_size: Number of rows per buffer chunk
+            full_frames: Whether to also store every frame in full (small grids only)
+        """
+        self.path = path
+        self.grid = grid
+        self.segment_frames = segment_frames
+        self.keyframe_interval = keyframe_interval
+        self.chunk_size = chunk_size
+        self.full_frames = full_frames
+
+        self.segments: List[Dict[str, Any]] = []
+        self.frame_count = 0
+        self.recorder: Optional[TrajectoryRecorder] = None
+
+        os.makedirs(path, exist_ok=True)
+        self.write_index()
+
+    def __enter__(self) -> 'TrajectoryWriter':
+        """Use the writer as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Write the last segment."""
+        self.close()
+
+    def record(self, state: Any) -> None:
+        """
+        Record the state of the simulation after a step.
+
+        Args:
+            state: StepState of the simulation
+        """
+        if self.recorder is None:
+            self.recorder = TrajectoryRecorder(self.grid, self.keyframe_interval, self.chunk_size, self.full_frames)
+
+        self.recorder.record(state)
+
+        if len(self.recorder) >= self.segment_frames:
+            self.flush()
+
+    def record_run(self, simulation: Any, max_steps: Optional[int] = None) -> 'TrajectoryWriter':
+        """
+        Record the current state of a simulation, then every step while it runs.
+
+        Args:
+            simulation: Simulation to run
+            max_steps: Maximum number of steps to run, None to run until everyone evacuated
+
+        Returns:
+            The writer itself
+        """
+        self.record(simulation.get_state())
+        for state in simulation.iter_steps(max_steps):
+            self.record(state)
+
+        return self
+
+    def flush(self) -> None:
+        """Write the frames recorded so far as a new segment."""
+        recorder = self.recorder
+        if recorder is None or not len(recorder):
+            return
+
+        name = f'segment-{len(self.segments):06d}'
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+
+        def save(array_name: str, array: Any) -> None:
+            save_array(os.path.join(directory, f'{array_name}.npy'), array)
+
+        save('steps', np.array(recorder.steps, dtype=np.int64))
+        for buffer_name in BUFFERS[1:]:
+            save(buffer_name, getattr(recorder, buffer_name).to_array())
+
+        sizes = [len(ids) for ids, _ in recorder.keyframes]
+        save('keyframe_offsets', np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64))
+        save('keyframe_ids', np.concatenate([ids for ids, _ in recorder.keyframes]))
+        save('keyframe_positions', np.concatenate([positions for _, positions in recorder.keyframes]))
+        save('keyframe_frames', np.array(recorder.keyframe_frames, dtype=np.int64))
+
+        save('layouts', np.stack(recorder.layouts))
+        save('layout_frames', np.array(recorder.layout_frames, dtype=np.int64))
+
+        if recorder.frames is not None:
+            save('frames', recorder.frames.to_array())
+
+        self.segments.append({'directory': name,
+                              'first_frame': self.frame_count,
+                              'frames': len(recorder),
+                              'id_count': recorder.id_count,
+                              'exits': [list(exit) for exit in recorder.exits],
+                              'full_frames': recorder.frames is not None})
+        self.frame_count += len(recorder)
+        self.recorder = None
+
+        self.write_index()
+
+    def write_index(self) -> None:
+        """Write the index of the segments, replacing the previous one at once."""
+        index = {'format_version': FORMAT_VERSION,
+                 'shape': list(self.grid.grid.shape),
+                 'frames': self.frame_count,
+                 'segments': self.segments}
+
+        path = os.path.join(self.path, INDEX_NAME)
+        temporary_path = f'{path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(index, file)
+        os.replace(temporary_path, path)
+
+    def close(self) -> None:
+        """Write the last, partial segment."""
+        self.flush()
+
+
+class TrajectoryReader:
+    """
+    Random access to the frames of a trajectory file.
+
+    Segments are memory-mapped when a frame of theirs is first read and only
+    the most recently used ones are kept open, so replaying runs of millions
+    of steps takes bounded memory. The reader is a sequence of frames, like
+    TrajectoryRecorder, so it can be passed to animation.create_animation.
+
+    Attributes:
+        path (str): Folder of the trajectory file
+        shape (Tuple[int, int]): Shape of the grid
+        segments (List[Dict[str, Any]]): Index entries of the segments
+        first_frames (List[int]): First frame of each segment
+        frame_count (int): Number of frames in the file
+        cached_segments (int): Maximum number of segments kept memory-mapped
+        open_segments (OrderedDict[int, TrajectorySegment]): Memory-mapped segments, least recently used first
+    """
+
+    def __init__(self, path: str, cached_segments: int = 4) -> None:
+        """
+        Open a trajectory file.
+
+        Args:
+            path: Folder of the trajectory file
+            cached_segments: Maximum number of segments kept memory-mapped
+
+        Raises:
+            ValueError: If the file was written in another format version
+        """
+        self.path = path
+        self.cached_segments = cached_segments
+        self.open_segments: 'OrderedDict[int, TrajectorySegment]' = OrderedDict()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Read the index again, e.g. to follow a run still being written."""
+        with open(os.path.join(self.path, INDEX_NAME)) as file:
+            index = json.load(file)
+
+        if index['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported trajectory format version {index['format_version']}")
+
+        self.shape = tuple(index['shape'])
+        self.segments = index['segments']
+        self.first_frames = [segment['first_frame'] for segment in self.segments]
+        self.frame_count = index['frames']
+
+    def __len__(self) -> int:
+        """Number of frames in the file."""
+        return self.frame_count
+
+    def __getitem__(self, index: int) -> NDArray:
+        """
+        Get a frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            uint8 grid of the frame
+        """
+        return self.get_frame(index)
+
+    def __iter__(self) -> Iterator[NDArray]:
+        """Iterate over the frames."""
+        return (self.get_frame(index) for index in range(len(self)))
+
+    def get_segment(self, number: int) -> TrajectorySegment:
+        """
+        Get a segment, memory-mapping it if needed.
+
+        Args:
+            number: Index of the segment
+
+        Returns:
+            The memory-mapped segment
+        """
+        segment = self.open_segments.get(number)
+        if segment is not None:
+            self.open_segments.move_to_end(number)
+            return segment
+
+        meta = self.segments[number]
+        segment = TrajectorySegment(os.path.join(self.path, meta['directory']), meta)
+
+        self.open_segments[number] = segment
+        while len(self.open_segments) > self.cached_segments:
+            self.open_segments.popitem(last=False)
+
+        return segment
+
+    def locate(self, index: int) -> Tuple[TrajectorySegment, int]:
+        """
+        Find the segment holding a frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            Tuple containing:
+                - Segment holding the frame
+                - Index of the frame in the segment
+        """
+        index = index + len(self) if index < 0 else index
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        number = bisect_right(self.first_frames, index) - 1
+
+        return self.get_segment(number), index - self.first_frames[number]
+
+    def get_frame(self, index: int) -> NDArray:
+        """
+        Get the grid of a frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            uint8 grid with the same cell values as FloorField.grid
+        """
+        segment, local_index = self.locate(index)
+
+        return segment.get_frame(local_index)
+
+    def get_positions(self, index: int) -> Tuple[NDArray, NDArray]:
+        """
+        Get the positions of the pedestrians in a frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            Tuple containing:
+                - (N,) ids of the pedestrians inside, in increasing order
+                - (N, 2) their positions (y, x)
+        """
+        segment, local_index = self.locate(index)
+
+        return segment.get_positions(local_index)
+
+    def get_step(self, index: int) -> int:
+        """
+        Get the simulation step of a frame.
+
+        Args:
+            index: Index of the frame, negative values counting from the end
+
+        Returns:
+            Step number of the frame
+        """
+        segment, local_index = self.locate(index)
+
+        return int(segment.steps[local_index])
+
+    def get_exit_events(self) -> Tuple[NDArray, NDArray, NDArray]:
+        """
+        Get every exit event in the file.
+
+        Returns:
+            Tuple containing:
+                - (M,) step of each event
+                - (M,) id of the evacuated pedestrian
+                - (M, 2) exit position (y, x) used
+        """
+        events = [self.get_segment(number).get_exit_events() for number in range(len(self.segments))]
+        if not events:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros((0, 2), dtype=np.int32)
+
+        return tuple(np.concatenate(arrays) for arrays in zip(*events))
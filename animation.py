@@ -1,13 +1,13 @@
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Optional, Sequence
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-from utils import exits, moves, width, height
-from PathFinding import get_path
 from matplotlib.animation import FuncAnimation
-from Matrix import PreferenceMatrix
+from simulation import Simulation
+import numpy as np
 from numpy.typing import NDArray
 
 Frames = List[NDArray]
+
 Grid = NDArray
 def get_frames(
    grid: Any,
@@ -16,7 +16,8 @@ def get_frames(
    rooms: List[dict],
    pedestrians_info: Any,
    dynamic_field: Any,
-   static_field: Any
+   static_field: Any,
+   rng: Optional[np.random.Generator] = None
 ) -> Frames:
     """
     Generate animation frames by simulating pedestrian movement.
@@ -25,77 +26,36 @@ def get_frames(
        grid: Environment grid
        cache: Path cache object
        is_rooms: Indicates if the simulation have rooms
-       rooms: List of room information
+       rooms: List of room information (rooms are read from grid.room_labels)
        pedestrians_info: Pedestrian collection object
        dynamic_field: Dynamic field object
        static_field: Static field object
+       rng: Random generator for the moves, a new one if not given
 
    Returns:
        List of grid states representing animation frames
     """
-    frames = []
-    steps = 0
-    while pedestrians_info.info:
-        pedestrians_info.prefered_next_positions, pedestrians_info.prefered_moves = [], []
-
-        # Calculate preferred next position for each pedestrian
-        for pedestrian in pedestrians_info.info:
-            inside_room = False
-            door_position = None
-
-            if is_rooms:
-                # Check if inside a room, returns TRUE and door position if so
-                inside_room, door_position = pedestrian.is_in_room(rooms)
-
-
-            selected_static_field, pedestrian = static_field.get_static_field(inside_room,
-                                                                              door_position,
-                                                                              pedestrian,
-                                                                              exits,
-                                                                              grid)
-
-            path = get_path(grid.check_congestion(pedestrian.position),
-                            pedestrian.is_near_exit(),
-                            pedestrian,
-                            pedestrian.chosen_exit,
-                            selected_static_field,
-                            cache,
-                            grid)
-
-            # Best move to exit
-            pedestrian.get_best_move(path)
-
-            cache.clear_cache(steps)
+    return record_frames(Simulation(grid, pedestrians_info, dynamic_field, static_field, cache, rooms, rng))
 
-            # Get dynamic field values for neighbors of current position
-            dynamic_field_neighbors = dynamic_field.get_neighbors_matrix(pedestrian.position)
-
-            preference_matrix = PreferenceMatrix()
-            preference_matrix.get_matrix(pedestrian.best_move, dynamic_field_neighbors)
-
-            # Calculate possible moves for the position
-            possible_moves = pedestrian.get_possible_moves(width, height, moves, grid)
-
-            pedestrian.get_move(preference_matrix.matrix, possible_moves)
-            pedestrian.prefered_next_position = tuple(a + b for a, b in zip(pedestrian.position, pedestrian.prefered_move))
-
-        # Resolve movement conflicts
-        pedestrians_info.solve_conflicts()
-
-        # Update grid with new positions after conflicts are resolved
-        grid.grid, dynamic_field = pedestrians_info.update_pedestrians_info(dynamic_field, exits, grid.grid)
+def record_frames(simulation: Simulation) -> Frames:
+    """
+    Run a simulation until everyone evacuated, copying the grid after each step.
 
-        frames.append(grid.grid.copy())
-        steps += 1
+    Args:
+        simulation: Simulation to run
 
-    return frames
+    Returns:
+        List of grid states representing animation frames
+    """
+    return [simulation.grid.grid.copy() for _ in simulation.iter_steps()]
 
-def create_animation(frames: Frames) -> None:
+def create_animation(frames: Sequence[NDArray]) -> None:
     """
     Create and display animation of pedestrian movement.
 
     Args:
-        frames: List of grid states representing animation frames
+        frames: List of grid states representing animation frames, or a
+            TrajectoryRecorder rebuilding them on demand
 
     Note:
         Color mapping:
@@ -0,0 +1 @@
+# Makes the top-level packages importable when running pytest from the repository root
@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, Tuple, Any, Optional, NamedTuple
+import numpy as np
+from numpy.typing import NDArray
+from scipy import stats
+from utils import exits as default_exits
+from simulation import Simulation
+
+Position = Tuple[int, int]
+
+
+class ReplicaResult(NamedTuple):
+    """
+    Outcome of one simulation run of an ensemble.
+
+    Attributes:
+        replica: Index of the replica in the ensemble
+        steps: Number of steps run
+        evacuated: Whether every pedestrian evacuated within the step limit
+        exit_counts: (E,) number of pedestrians evacuated through each exit, in scenario order
+        exit_first_steps: (E,) step of the first evacuation through each exit, 0 if none
+        exit_last_steps: (E,) step of the last evacuation through each exit, 0 if none
+    """
+    replica: int
+    steps: int
+    evacuated: bool
+    exit_counts: NDArray
+    exit_first_steps: NDArray
+    exit_last_steps: NDArray
+
+
+class EnsembleSummary(NamedTuple):
+    """
+    Statistics of an ensemble of runs.
+
+    Attributes:
+        replicas: Number of runs
+        evacuated: Number of runs in which every pedestrian evacuated
+        evacuation_time: Mean, standard deviation, confidence interval and quantiles
+            of the evacuation time (steps) of the runs that completed
+        exits: Per exit: mean count, mean throughput (pedestrians per step
+            while the exit was used) and their confidence intervals
+    """
+    replicas: int
+    evacuated: int
+    evacuation_time: Dict[str, Any]
+    exits: Dict[Position, Dict[str, Any]]
+
+
+def run_replica(
+        replica: int,
+        seed: np.random.SeedSequence,
+        scenario: Dict[str, Any],
+        max_steps: Optional[int] = None
+) -> ReplicaResult:
+    """
+    Run one simulation of an ensemble.
+
+    Args:
+        replica: Index of the replica in the ensemble
+        seed: Seed of the replica's random generator
+        scenario: Keyword arguments of Simulation.setup
+        max_steps: Maximum number of steps, None to run until everyone evacuated
+
+    Returns:
+        Steps run and evacuations per exit
+
+    Note:
+        Every random draw of the run, pedestrian placement included, comes
+        from the generator seeded here, so the result only depends on seed.
+    """
+    simulation = Simulation.setup(**scenario, rng=np.random.default_rng(seed))
+    exits = [tuple(exit) for exit in scenario.get('exits', default_exits)]
+    exit_indices = {exit: index for index, exit in enumerate(exits)}
+
+    exit_counts = np.zeros(len(exits), dtype=np.int64)
+    exit_first_steps = np.zeros(len(exits), dtype=np.int64)
+    exit_last_steps = np.zeros(len(exits), dtype=np.int64)
+
+    for state in simulation.iter_steps(max_steps):
+        for exit in map(tuple, state.evacuated_positions.tolist()):
+            index = exit_indices[exit]
+            if not exit_counts[index]:
+                exit_first_steps[index] = state.step
+            exit_counts[index] += 1
+            exit_last_steps[index] = state.step
+
+    return ReplicaResult(replica, simulation.steps, simulation.finished, exit_counts, exit_first_steps,
+                         exit_last_steps)
+
+
+def run_ensemble(
+        replicas: int,
+        seed: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_steps: Optional[int] = None,
+        **scenario: Any
+) -> List[ReplicaResult]:
+    """
+    Run independent seeded replicas of a simulation across processes.
+
+    Args:
+        replicas: Number of runs
+        seed: Entropy of the ensemble, a random one if not given
+        workers: Number of processes, the number of CPUs if not given.
+            1 runs the replicas in the current process.
+        max_steps: Maximum number of steps per run, None to run until everyone evacuated
+        **scenario: Keyword arguments of Simulation.setup (num_pedestrians, is_rooms, ...)
+
+    Returns:
+        Result of each replica, in replica order
+
+    Note:
+        Replica i is seeded with the i-th child of SeedSequence(seed), so its
+        result only depends on seed and i, not on the number of workers or
+        the order in which runs finish. Replicas share nothing but the
+        on-disk static field store, so the runner scales with the cores.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(replicas)
+    workers = workers if workers is not None else os.cpu_count() or 1
+
+    if workers == 1:
+        return [run_replica(replica, replica_seed, scenario, max_steps) for replica, replica_seed in enumerate(seeds)]
+
+    # A few chunks per worker balance uneven run lengths with little overhead
+    chunksize = max(1, replicas // (4 * workers))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run_replica, range(replicas), seeds, repeat(scenario), repeat(max_steps),
+                                 chunksize=chunksize))
+
+
+def mean_interval(values: NDArray, confidence: float) -> Dict[str, float]:
+    """
+    Get the mean of samples and its Student's t confidence interval.
+
+    Args:
+        values: Samples
+        confidence: Confidence level of the interval
+
+    Returns:
+        Dictionary with mean, std, and ci (low, high); NaN where there are too few samples
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {'mean': np.nan, 'std': np.nan, 'ci': (np.nan, np.nan)}
+
+    mean = float(values.mean())
+    if len(values) < 2:
+        return {'mean': mean, 'std': np.nan, 'ci': (np.nan, np.nan)}
+
+    std = float(values.std(ddof=1))
+    half_width = float(stats.t.ppf((1 + confidence) / 2, len(values) - 1) * std / np.sqrt(len(values)))
+
+    return {'mean': mean, 'std': std, 'ci': (mean - half_width, mean + half_width)}
+
+
+def summarize(
+        results: List[ReplicaResult],
+        exits: List[Position] = default_exits,
+        confidence: float = 0.95
+) -> EnsembleSummary:
+    """
+    Aggregate the results of an ensemble.
+
+    Args:
+        results: Results of run_ensemble
+        exits: Exits of the scenario, in order
+        confidence: Confidence level of the intervals
+
+    Returns:
+        Evacuation time distribution and per-exit throughput statistics
+    """
+    evacuated = [result for result in results if result.evacuated]
+    times = np.array([result.steps for result in evacuated], dtype=np.float64)
+
+    evacuation_time = mean_interval(times, confidence)
+    evacuation_time['quantiles'] = ({quantile: float(np.quantile(times, quantile)) for quantile in (0.05, 0.5, 0.95)}
+                                    if len(times) else {})
+    evacuation_time['min'] = float(times.min()) if len(times) else np.nan
+    evacuation_time['max'] = float(times.max()) if len(times) else np.nan
+
+    counts = np.array([result.exit_counts for result in results], dtype=np.float64).reshape(len(results), -1)
+    first_steps = np.array([result.exit_first_steps for result in results], dtype=np.float64).reshape(len(results), -1)
+    last_steps = np.array([result.exit_last_steps for result in results], dtype=np.float64).reshape(len(results), -1)
+
+    exit_statistics = {}
+    for index, exit in enumerate(map(tuple, exits)):
+        used = last_steps[:, index] > 0
+        # Pedestrians per step from the first to the last evacuation through the exit
+        throughputs = counts[used, index] / (last_steps[used, index] - first_steps[used, index] + 1)
+
+        exit_statistics[exit] = {'count': mean_interval(counts[:, index], confidence),
+                                 'throughput': mean_interval(throughputs, confidence)}
+
+    return EnsembleSummary(len(results), len(evacuated), evacuation_time, exit_statistics)
+
+
+def main(replicas: int = 32, seed: int = 0, workers: Optional[int] = None) -> None:
+    """
+    Print the evacuation statistics of an ensemble of the utils.py scenario.
+
+    Args:
+        replicas: Number of runs
+        seed: Entropy of the ensemble
+        workers: Number of processes, the number of CPUs if not given
+    """
+    summary = summarize(run_ensemble(replicas, seed, workers))
+    time = summary.evacuation_time
+
+    print(f"{summary.evacuated}/{summary.replicas} runs evacuated")
+    print(f"evacuation time: {time['mean']:.1f} ± {time['std']:.1f} steps, "
+          f"95% CI [{time['ci'][0]:.1f}, {time['ci'][1]:.1f}], "
+          f"range [{time['min']:.0f}, {time['max']:.0f}]")
+
+    for exit, statistics in summary.exits.items():
+        count, throughput = statistics['count'], statistics['throughput']
+        print(f"exit {exit}: {count['mean']:.1f} pedestrians "
+              f"[{count['ci'][0]:.1f}, {count['ci'][1]:.1f}], "
+              f"{throughput['mean']:.2f} per step [{throughput['ci'][0]:.2f}, {throughput['ci'][1]:.2f}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,34 @@
-from typing import List, Dict, Any
-from utils import width, height, exits, num_pedestrians, is_rooms
-from Fields import FloorField, DynamicField, StaticField
-from Cache import Cache
-from Pedestrians import Pedestrians
-from animation import create_animation, get_frames
+from utils import trajectory_dir
+from simulation import Simulation
+from animation import create_animation
+from Trajectory import TrajectoryRecorder, TrajectoryWriter, TrajectoryReader
 
 def main() -> None:
     """
     Main simulation function for pedestrian evacuation.
 
     This function sets up and runs the pedestrian evacuation simulation by:
-    1. Initializing the caching system
-    2. Creating and configuring the environment grid
-    3. Setting up pedestrian positions
-    4. Creating dynamic and static fields
-    5. Running the simulation
-    6. Displaying the animation
+    1. Creating and configuring the environment grid (see Simulation.setup)
+    2. Setting up pedestrian positions
+    3. Creating dynamic and static fields (precomputed for the whole grid if enabled)
+    4. Running the simulation
+    5. Displaying the animation
     """
-    # Initialize path caching system
-    cache = Cache()
-
-    # Create and configure environment grid with exits and rooms
-    grid = FloorField(width, height)
-    grid.add_exit(exits)
-    rooms = None
-
-    if is_rooms:
-        rooms = grid.setup_rooms()
-
-    # Initialize and positionate pedestrians
-    pedestrians_info = Pedestrians()
-    pedestrians_info.info = grid.set_pedestrians(pedestrians_info, num_pedestrians)
-
-    # Initialize dynamic and static fields
-    dynamic_field, static_field = DynamicField(width, height), StaticField(width, height)
-
-    # Run simulation and create animation
-    frames = get_frames(grid, cache, is_rooms, rooms, pedestrians_info, dynamic_field, static_field)
+    # Create the environment, pedestrians and fields from the settings in utils.py
+    simulation = Simulation.setup()
+
+    # Run simulation, recording the trajectories instead of full grid copies
+    if trajectory_dir:
+        # Stream them to disk, then replay from the memory-mapped file
+        with TrajectoryWriter(trajectory_dir, simulation.grid) as writer:
+            writer.record_run(simulation)
+        frames = TrajectoryReader(trajectory_dir)
+    else:
+        frames = TrajectoryRecorder(simulation.grid).record_run(simulation)
+
+    # Create animation, rebuilding each frame from the recording
     create_animation(frames)
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,248 @@
+from typing import List, Tuple, Any, Optional, Iterator, NamedTuple
+import numpy as np
+from numpy.typing import NDArray
+from utils import (width, height, exits, num_pedestrians, is_rooms, precompute_static_field,
+                   static_field_cache_dir, no_move, get_move_code)
+from Fields import FloorField, DynamicField, StaticField
+from Cache import Cache, StaticFieldStore
+from Pedestrians import Pedestrians
+from PathFinding import get_next_move
+from Matrix import transition_probabilities, sample_moves
+
+Position = Tuple[int, int]
+
+# Move code of staying in place, whose preference matrix is the unrotated one
+stay = get_move_code((0, 0))
+
+
+class StepState(NamedTuple):
+    """
+    State of the simulation after one step.
+
+    Attributes:
+        step: Number of steps run so far
+        ids: (N,) identifiers of the pedestrians still in the simulation
+        positions: (N, 2) positions (y, x) of those pedestrians
+        evacuated_ids: (M,) identifiers of the pedestrians evacuated in this step
+        evacuated_positions: (M, 2) exits they left through
+    """
+    step: int
+    ids: NDArray
+    positions: NDArray
+    evacuated_ids: NDArray
+    evacuated_positions: NDArray
+
+
+class Simulation:
+    """
+    Headless pedestrian evacuation simulation.
+
+    Owns the environment, the fields, the path cache and the pedestrians and
+    advances them one step at a time, without any plotting. Consumers either
+    call step() themselves, iterate over iter_steps() to get each state as it
+    is produced, or call run() when only the final state matters.
+
+    Attributes:
+        grid (FloorField): Environment grid
+        pedestrians (Pedestrians): Pedestrians still in the simulation
+        dynamic_field (DynamicField): Dynamic field
+        static_field (StaticField): Static field
+        cache (Cache): Path cache
+        rooms (Optional[List[dict]]): Room information, None without rooms
+        rng (np.random.Generator): Random generator of the moves, exits and conflicts
+        steps (int): Number of steps run so far
+    """
+
+    def __init__(
+            self,
+            grid: FloorField,
+            pedestrians: Pedestrians,
+            dynamic_field: DynamicField,
+            static_field: StaticField,
+            cache: Optional[Cache] = None,
+            rooms: Optional[List[dict]] = None,
+            rng: Optional[np.random.Generator] = None
+    ) -> None:
+        """
+        Initialize a simulation from already set up components.
+
+        Args:
+            grid: Environment grid with exits, rooms and pedestrians placed
+            pedestrians: Pedestrians collection object
+            dynamic_field: Dynamic field object
+            static_field: Static field object
+            cache: Path cache object, a new one if not given
+            rooms: List of room information
+            rng: Random generator, a new one if not given
+        """
+        self.grid = grid
+        self.pedestrians = pedestrians
+        self.dynamic_field = dynamic_field
+        self.static_field = static_field
+        self.cache = cache if cache is not None else Cache()
+        self.rooms = rooms
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.steps = 0
+
+    @classmethod
+    def setup(
+            cls,
+            width: int = width,
+            height: int = height,
+            exits: List[Position] = exits,
+            num_pedestrians: int = num_pedestrians,
+            is_rooms: bool = is_rooms,
+            precompute: bool = precompute_static_field,
+            cache_dir: Optional[str] = static_field_cache_dir,
+            rng: Optional[np.random.Generator] = None
+    ) -> 'Simulation':
+        """
+        Create the environment, fields and pedestrians of a scenario.
+
+        Args:
+            width: Width of the environment grid
+            height: Height of the environment grid
+            exits: List of exit positions
+            num_pedestrians: Number of pedestrians to place
+            is_rooms: Whether to create the rooms
+            precompute: Whether to precompute the static fields for the whole grid
+            cache_dir: Folder caching precomputed static fields (None disables it)
+            rng: Random generator of the whole run, pedestrian placement included,
+                a new one if not given
+
+        Returns:
+            Simulation ready to run, defaults taken from utils.py
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+
+        grid = FloorField(width, height)
+        grid.add_exit(exits)
+        rooms = grid.setup_rooms() if is_rooms else None
+
+        pedestrians = Pedestrians()
+        grid.set_pedestrians(pedestrians, num_pedestrians, rng)
+
+        dynamic_field, static_field = DynamicField(width, height), StaticField(width, height)
+
+        if precompute:
+            doors = [room['door'] for room in rooms] if rooms else []
+            store = StaticFieldStore(cache_dir) if cache_dir else None
+            static_field.precompute(grid, exits, doors, store)
+
+        return cls(grid, pedestrians, dynamic_field, static_field, rooms=rooms, rng=rng)
+
+    @property
+    def finished(self) -> bool:
+        """Whether every pedestrian has evacuated."""
+        return not len(self.pedestrians)
+
+    def get_state(self) -> StepState:
+        """
+        Get the current state of the simulation.
+
+        Returns:
+            State with copies of the pedestrian arrays
+        """
+        pedestrians = self.pedestrians
+
+        return StepState(self.steps,
+                         pedestrians.ids[:pedestrians.count].copy(),
+                         pedestrians.positions,
+                         pedestrians.evacuated_ids,
+                         pedestrians.evacuated_positions)
+
+    def step(self) -> StepState:
+        """
+        Move every pedestrian once.
+
+        Returns:
+            State of the simulation after the step
+        """
+        grid, static_field, pedestrians = self.grid, self.static_field, self.pedestrians
+        positions = pedestrians.positions
+
+        # Room of every pedestrian from the room label grid, 0 outside of rooms
+        room_ids, doors = grid.get_rooms(positions)
+
+        # Congestion around every pedestrian from one congestion map
+        congested = grid.check_congestions(positions)
+
+        # Draw an exit at once for everyone outside of rooms without an open one
+        rows = np.flatnonzero((room_ids == 0) & pedestrians.needs_exit(grid.exits))
+        pedestrians.set_chosen_exits(rows, static_field.select_exits(positions[rows], grid.exits, grid, self.rng))
+
+        # Calculate best move towards the exit for each pedestrian
+        for pedestrian, room_id, door, congestion in zip(pedestrians, room_ids, doors, congested):
+            inside_room = bool(room_id)
+            door_position = (int(door[0]), int(door[1])) if inside_room else None
+
+            selected_static_field, pedestrian = static_field.get_static_field(inside_room,
+                                                                              door_position,
+                                                                              pedestrian,
+                                                                              grid.exits,
+                                                                              grid,
+                                                                              self.rng)
+
+            move_code = get_next_move(bool(congestion),
+                                      pedestrian.is_near_exit(),
+                                      pedestrian,
+                                      pedestrian.chosen_exit,
+                                      selected_static_field,
+                                      self.cache,
+                                      grid)
+
+            # Best move to exit
+            pedestrian.get_best_move(move_code)
+
+        # Move probabilities of the whole crowd, blocked moves masked out
+        count = len(pedestrians)
+        best_moves = pedestrians.best_moves[:count]
+        probabilities = transition_probabilities(np.where(best_moves == no_move, stay, best_moves),
+                                                 self.dynamic_field.get_neighbors_matrices(positions),
+                                                 grid.get_moves_masks(positions))
+
+        # Draw every pedestrian's preferred move at once
+        pedestrians.prefered_moves[:count], pedestrians.probabilities[:count] = sample_moves(probabilities, self.rng)
+
+        # Resolve movement conflicts
+        pedestrians.solve_conflicts(self.rng)
+
+        # Update grid with new positions after conflicts are resolved
+        self.grid, self.dynamic_field = pedestrians.update_pedestrians_info(self.dynamic_field, grid.exits, grid)
+
+        # Drop cached paths that depended on cells whose occupancy changed
+        self.cache.invalidate(self.grid.occupancy.changed)
+
+        self.steps += 1
+
+        return self.get_state()
+
+    def iter_steps(self, max_steps: Optional[int] = None) -> Iterator[StepState]:
+        """
+        Run the simulation lazily, one step per iteration.
+
+        Args:
+            max_steps: Maximum number of steps to run, None to run until everyone evacuated
+
+        Yields:
+            State of the simulation after each step
+        """
+        steps = 0
+        while not self.finished and (max_steps is None or steps < max_steps):
+            steps += 1
+            yield self.step()
+
+    def run(self, max_steps: Optional[int] = None) -> int:
+        """
+        Run the simulation without keeping the intermediate states.
+
+        Args:
+            max_steps: Maximum number of steps to run, None to run until everyone evacuated
+
+        Returns:
+            Number of steps run so far
+        """
+        for _ in self.iter_steps(max_steps):
+            pass
+
+        return self.steps
@@ -0,0 +1,35 @@
+import numpy as np
+from Fields import FloorField
+from Cache import Cache
+from PathFinding import check_congestion
+from PathFinding.grid_astar import occupied_counts
+from utils import exits
+
+
+def make_grid() -> FloorField:
+    grid = FloorField(50, 50)
+    grid.add_exit(exits)
+    for position in [(20, 20), (20, 23), (23, 20), (17, 20), (20, 17)]:
+        grid[position] = 1
+    grid.update_occupancy()
+    return grid
+
+
+def test_congestion_helpers_follow_grid_settings():
+    grid = make_grid()
+    assert occupied_counts(grid)[20, 20] == 1
+    assert not check_congestion(grid, (20, 20))
+
+    grid.congestion_radius, grid.congestion_threshold = 3, 4
+    assert occupied_counts(grid)[20, 20] == 5
+    assert check_congestion(grid, (20, 20)) == grid.check_congestion((20, 20))
+    assert check_congestion(grid, (20, 20))
+
+
+def test_cache_region_follows_grid_radius():
+    grid = make_grid()
+    cache = Cache(horizon=1)
+    grid.congestion_radius = 4
+
+    assert cache.get_region([(20, 20)], grid) == (16, 25, 16, 25)
+    assert Cache(radius=1).get_region([(20, 20)], grid) == (19, 22, 19, 22)
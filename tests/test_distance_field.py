@@ -0,0 +1,60 @@
+import numpy as np
+from PathFinding import distance_fields, repair_distance_field
+from utils import move_offsets, no_move, orthogonal_cost, diagonal_cost
+
+SIZE = 30
+TARGET = (0, 15)
+
+
+def field_of(walls):
+    distances, next_moves, steps = distance_fields(np.where(walls, 3, 0), [TARGET])
+    return distances[0].copy(), next_moves[0].copy(), steps[0].copy()
+
+
+def assert_matches_fresh_field(walls, distances, next_moves, steps):
+    expected_distances, _, expected_steps = field_of(walls)
+
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-9)
+    assert np.array_equal(np.isinf(steps), np.isinf(expected_steps))
+
+    # Following the next moves from any reachable cell reaches the target
+    # through free cells, with the stored cost and number of cells
+    for start in map(tuple, np.argwhere(np.isfinite(distances))):
+        (y, x), cost, cells = start, 0.0, 1
+        while (y, x) != TARGET:
+            move = next_moves[y, x]
+            assert move != no_move and cells <= SIZE * SIZE
+            dy, dx = move_offsets[move]
+            y, x = y + dy, x + dx
+            assert not walls[y, x]
+            cost += diagonal_cost if dy and dx else orthogonal_cost
+            cells += 1
+
+        assert np.isclose(cost, distances[start])
+        assert cells == steps[start]
+
+    reachable = np.isfinite(distances)
+    assert np.all(next_moves[~reachable] == no_move)
+
+
+def test_repair_matches_fresh_field():
+    rng = np.random.default_rng(0)
+    walls = rng.random((SIZE, SIZE)) < 0.2
+    walls[TARGET] = False
+    distances, next_moves, steps = field_of(walls)
+
+    for _ in range(30):
+        free = np.argwhere(~walls)
+        free = free[np.any(free != TARGET, axis=1)]
+        blocked = [tuple(cell) for cell in free[rng.choice(len(free), size=rng.integers(1, 6), replace=False)]]
+        for cell in blocked:
+            walls[cell] = True
+        repair_distance_field(walls, TARGET, distances, next_moves, steps, blocked=blocked)
+        assert_matches_fresh_field(walls, distances, next_moves, steps)
+
+        wall_cells = np.argwhere(walls)
+        unblocked = [tuple(cell) for cell in wall_cells[rng.choice(len(wall_cells), size=rng.integers(1, 6), replace=False)]]
+        for cell in unblocked:
+            walls[cell] = False
+        repair_distance_field(walls, TARGET, distances, next_moves, steps, unblocked=unblocked)
+        assert_matches_fresh_field(walls, distances, next_moves, steps)
@@ -0,0 +1,50 @@
+import warnings
+import numpy as np
+import pytest
+from Fields import FloorField, StaticField
+from Pedestrians import Pedestrians
+from utils import exits
+
+# Cell fully enclosed by walls
+SEALED = (25, 25)
+
+
+def make_grid() -> FloorField:
+    grid = FloorField(50, 50)
+    grid.add_exit(exits)
+    grid.add_obstacle([(SEALED[0] + dy, SEALED[1] + dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx])
+    return grid
+
+
+@pytest.mark.parametrize('precompute', [False, True])
+def test_select_exits_skips_positions_without_reachable_exit(precompute):
+    grid = make_grid()
+    static_field = StaticField(50, 50)
+    if precompute:
+        static_field.precompute(grid, exits)
+
+    positions = np.array([SEALED, (40, 10), SEALED, (10, 40)], dtype=np.intp)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        chosen = static_field.select_exits(positions, exits, grid, np.random.default_rng(0))
+
+    assert chosen[0] is None and chosen[2] is None
+    assert chosen[1] in exits and chosen[3] in exits
+
+
+def test_unreachable_exits_keep_current_target():
+    grid = make_grid()
+    static_field = StaticField(50, 50)
+    pedestrians = Pedestrians()
+    pedestrian = pedestrians.add(SEALED)
+
+    with pytest.raises(ValueError):
+        static_field.get_static_field(False, None, pedestrian, exits, grid)
+
+    pedestrians.set_chosen_exits(np.array([0]), [exits[1]])
+    pedestrians.set_chosen_exits(np.array([0]), static_field.select_exits(np.array([SEALED]), exits[:1], grid,
+                                                                           np.random.default_rng(0)))
+    field, pedestrian = static_field.get_static_field(False, None, pedestrian, exits[:1], grid)
+
+    assert pedestrian.chosen_exit == exits[1]
+    assert field['exit'] == exits[1]
@@ -0,0 +1,16 @@
+from Fields import FloorField
+from utils import exits
+
+
+def test_open_exit_only_bumps_layout_when_the_grid_changes():
+    grid = FloorField(50, 50)
+    grid.add_exit(exits)
+    version = grid.layout_version
+
+    assert grid.open_exit(exits[0]) == []
+    assert grid.layout_version == version
+
+    grid.close_exit(exits[0])
+    assert grid.open_exit(exits[0]) == [exits[0]]
+    assert grid.layout_version == version + 2
+    assert grid.grid[exits[0]] == 2 and exits[0] in grid.exits
@@ -0,0 +1,43 @@
+import numpy as np
+from PathFinding import HierarchicalPlanner, GridAStar, get_path_cost
+
+
+def assert_valid_path(cells, path, start, goal):
+    assert path[0] == start and path[-1] == goal
+    for (y, x), (next_y, next_x) in zip(path, path[1:]):
+        assert max(abs(next_y - y), abs(next_x - x)) == 1
+        assert cells[next_y, next_x] != 3
+
+
+def test_corner_crossing_connects_diagonal_clusters():
+    # Four 16x16 clusters walled off from each other, except through the
+    # diagonal move from (15, 15) to (16, 16) across their shared corner
+    cells = np.zeros((32, 32), dtype=int)
+    cells[15:17, :] = 3
+    cells[:, 15:17] = 3
+    cells[15, 15] = cells[16, 16] = 0
+
+    planner = HierarchicalPlanner(cells)
+    path = planner.find_path((0, 0), (31, 31))
+
+    assert_valid_path(cells, path, (0, 0), (31, 31))
+    assert planner.find_path((0, 31), (31, 31)) == []
+
+
+def test_paths_match_astar_on_random_grids():
+    rng = np.random.default_rng(0)
+
+    for _ in range(5):
+        grid = np.where(rng.random((64, 64)) < 0.3, 3, 0)
+        planner, engine = HierarchicalPlanner(grid), GridAStar(grid)
+        free = np.argwhere(grid != 3)
+
+        for start, goal in rng.choice(free, size=(40, 2)):
+            start, goal = tuple(start), tuple(goal)
+            expected = engine.find_path(start, goal)
+            path = planner.find_path(start, goal)
+
+            assert bool(path) == bool(expected)
+            if path:
+                assert_valid_path(grid, path, start, goal)
+                assert get_path_cost(path, grid, False) <= 1.2 * get_path_cost(expected, grid, False)
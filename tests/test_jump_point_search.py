@@ -0,0 +1,32 @@
+import numpy as np
+from Fields import FloorField
+from PathFinding import find_path, find_path_jps, get_path_cost
+from utils import exits
+
+
+def make_grid() -> FloorField:
+    grid = FloorField(50, 50)
+    grid.add_exit(exits)
+    grid.setup_rooms()
+    return grid
+
+
+def test_jps_accepts_numpy_integer_positions():
+    grid = make_grid()
+    start = tuple(np.array([40, 25], dtype=np.intp))
+    goal = tuple(np.array(exits[0], dtype=np.intp))
+
+    path = find_path_jps(grid, start, goal, False)
+
+    assert path[0] == (40, 25) and path[-1] == exits[0]
+    assert all(type(value) is int for cell in path for value in cell)
+
+
+def test_jps_matches_astar_cost():
+    grid = make_grid()
+
+    for start in [(40, 25), (10, 20), (45, 10), (5, 45)]:
+        for goal in exits:
+            jps_path = find_path_jps(grid, start, goal, False)
+            astar_path = find_path(grid, start, goal, False)
+            assert np.isclose(get_path_cost(jps_path, grid, False), get_path_cost(astar_path, grid, False))
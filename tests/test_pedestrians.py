@@ -0,0 +1,65 @@
+import numpy as np
+from Pedestrians import Pedestrians
+from utils import get_move_code
+
+
+def make_group() -> Pedestrians:
+    pedestrians = Pedestrians()
+    for position in [(1, 1), (2, 2), (3, 3)]:
+        pedestrians.add(position)
+    return pedestrians
+
+
+def test_info_setter_clears_on_empty_list():
+    pedestrians = make_group()
+    pedestrians.info = []
+
+    assert len(pedestrians) == 0
+
+
+def test_info_setter_keeps_filtered_views():
+    pedestrians = make_group()
+    pedestrians.info = [pedestrian for pedestrian in pedestrians.info if pedestrian.id != 1]
+
+    assert [pedestrian.id for pedestrian in pedestrians] == [0, 2]
+    assert [pedestrian.position for pedestrian in pedestrians] == [(1, 1), (3, 3)]
+    assert pedestrians.alive.sum() == 2
+
+
+def test_solve_conflicts_leaves_one_pedestrian_per_cell():
+    rng = np.random.default_rng(0)
+
+    for _ in range(20):
+        pedestrians = Pedestrians()
+        cells = rng.choice(100, size=40, replace=False)
+        for cell in cells:
+            pedestrians.add(divmod(int(cell), 10))
+        pedestrians.prefered_moves[:40] = rng.integers(0, 9, size=40)
+        pedestrians.probabilities[:40] = rng.random(40)
+
+        pedestrians.solve_conflicts(rng)
+
+        targets = pedestrians.prefered_next_positions
+        assert len(np.unique(targets, axis=0)) == len(targets)
+
+
+def test_solve_conflicts_winners_follow_probabilities():
+    rng = np.random.default_rng(0)
+    probabilities = np.array([0.2, 0.3, 0.5])
+    moves = [get_move_code((0, 1)), get_move_code((1, 0)), get_move_code((-1, -1))]
+
+    pedestrians = Pedestrians()
+    for position in [(5, 4), (4, 5), (6, 6)]:
+        pedestrians.add(position)
+    pedestrians.probabilities[:3] = probabilities
+
+    wins = np.zeros(3)
+    trials = 5000
+    for _ in range(trials):
+        pedestrians.prefered_moves[:3] = moves
+        pedestrians.solve_conflicts(rng)
+        winners = np.flatnonzero(pedestrians.prefered_moves[:3] != get_move_code((0, 0)))
+        assert len(winners) == 1
+        wins[winners] += 1
+
+    np.testing.assert_allclose(wins / trials, probabilities, atol=0.025)
@@ -0,0 +1,53 @@
+import json
+import os
+import numpy as np
+import pytest
+from simulation import Simulation
+from Trajectory import TrajectoryWriter, TrajectoryReader
+from Trajectory.trajectory_file import FORMAT_VERSION, INDEX_NAME
+
+
+def record(path, steps=40):
+    simulation = Simulation.setup(num_pedestrians=30, precompute=False, cache_dir=None,
+                                  rng=np.random.default_rng(0))
+    grid = simulation.grid
+    frames = [grid.grid.copy()]
+
+    with TrajectoryWriter(path, grid, segment_frames=7, keyframe_interval=3, chunk_size=16) as writer:
+        writer.record(simulation.get_state())
+
+        for state in simulation.iter_steps(steps):
+            if state.step == 10:
+                # Mid-run layout change: wall off an empty corner cell
+                blocked = grid.add_obstacle([(1, 1)])
+                assert blocked
+                simulation.static_field.update_layout(grid, blocked)
+            writer.record(state)
+            frames.append(grid.grid.copy())
+
+    return frames
+
+
+def test_reader_round_trip_matches_live_grid(tmp_path):
+    frames = record(str(tmp_path))
+    reader = TrajectoryReader(str(tmp_path), cached_segments=2)
+
+    assert len(reader) == len(frames)
+    assert len(reader.segments) > 2
+
+    for index in np.random.default_rng(1).permutation(len(frames)):
+        np.testing.assert_array_equal(reader[int(index)], frames[index])
+    np.testing.assert_array_equal(reader[-1], frames[-1])
+
+
+def test_reader_rejects_other_format_versions(tmp_path):
+    record(str(tmp_path), steps=5)
+    index_path = os.path.join(str(tmp_path), INDEX_NAME)
+    with open(index_path) as file:
+        index = json.load(file)
+    index['format_version'] = FORMAT_VERSION + 1
+    with open(index_path, 'w') as file:
+        json.dump(index, file)
+
+    with pytest.raises(ValueError):
+        TrajectoryReader(str(tmp_path))
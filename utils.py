@@ -1,4 +1,4 @@
-from typing import Tuple, List
+from typing import Tuple, List, Any, Optional
 import numpy as np
 from numpy.typing import NDArray
 
@@ -33,6 +33,10 @@ moves: List[List[Tuple[int, int]]] = [
    [( 1, -1), ( 1,  0), ( 1,  1)]
 ]
 
+# Move codes: index of each move in the flattened moves matrix (4 = stay)
+move_offsets: NDArray = np.array(moves).reshape(-1, 2)
+no_move: int = -1  # Code used when there is no next move (target reached or unreachable)
+
 # All possible movement directions (orthogonal and diagonal)
 directions: List[Tuple[int, int]] = [
    # Orthogonal movements
@@ -46,10 +50,49 @@ kernel = np.array([[0.05, 0.2, 0.05],
                    [0.2, 0.0, 0.2],
                    [0.05, 0.2, 0.05]])
 
+# Movement costs used by pathfinding (orthogonal / diagonal step)
+orthogonal_cost: float = 1.0
+diagonal_cost: float = 1.4
+
+# Precompute whole-grid static fields (True) / compute them per cell with A* (False)
+precompute_static_field: bool = True
+
+# Folder where precomputed static fields are cached between runs (None disables it)
+static_field_cache_dir: Optional[str] = '.static_field_cache'
+
+# Folder main streams the trajectories to and replays the animation from (None keeps them in memory)
+trajectory_dir: Optional[str] = None
+
+# Pathfinding backend for per-cell static fields and cached congested paths ('astar', 'jps', 'hpa')
+path_backend: str = 'astar'
+
+# Maximum number of congested path searches kept in the cache
+path_cache_size: int = 4096
+
+# Number of cells along a cached path whose occupancy invalidates it (None for the whole path)
+path_cache_horizon: Optional[int] = 8
+
+# Share one congestion-weighted Dijkstra per exit and step between congested pedestrians
+batched_congestion_paths: bool = True
+
+# A pedestrian is congested when more than congestion_threshold cells are occupied
+# within congestion_radius of it (FloorField attributes, can be set per scenario)
+congestion_threshold: int = 3
+congestion_radius: int = 2
+
 # Dynamic Field decay and diffusion parameters
 delta: float = 0.005
 diffusion_coef: float = 0.01875
 
+# Dynamic Field storage type (np.float32 halves memory traffic on large grids)
+dynamic_field_dtype: type = np.float64
+
+# Side of the tiles the Dynamic Field tracks as active (None updates the whole field every step)
+dynamic_field_tile_size: Optional[int] = 32
+
+# Tiles whose Dynamic Field values all fall to or below it are zeroed and skipped
+dynamic_field_threshold: float = 1e-6
+
 
 def get_min_max(
         position: Tuple[int, int],
@@ -80,4 +123,37 @@ def get_min_max(
     x_min = max(0, x - radius)
     x_max = min(grid.shape[1], x + radius + 1)
 
-    return y_min, y_max, x_min, x_max
\ No newline at end of file
+    return y_min, y_max, x_min, x_max
+
+
+def get_congestion_settings(grid: Any) -> Tuple[int, int]:
+    """
+    Get the congestion threshold and radius of a grid.
+
+    Args:
+        grid: FloorField or environment matrix
+
+    Returns:
+        Tuple containing:
+            - threshold: Occupied cells around a position above which it is congested
+            - radius: Radius of the window counted for congestion
+
+    Note:
+        Plain matrices use the congestion_threshold and congestion_radius defaults
+    """
+    return (getattr(grid, 'congestion_threshold', congestion_threshold),
+            getattr(grid, 'congestion_radius', congestion_radius))
+
+
+def get_move_code(move: Tuple[int, int]) -> int:
+    """
+    Convert a relative move into its move code.
+
+    Args:
+        move: Movement as (dy, dx), each component in {-1, 0, 1}
+
+    Returns:
+        Index of the move in the flattened moves matrix
+    """
+    dy, dx = move
+    return (dy + 1) * 3 + (dx + 1)
\ No newline at end of file